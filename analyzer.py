@@ -0,0 +1,112 @@
+import os
+import re
+import json
+import hashlib
+import threading
+from multiprocessing import cpu_count
+import utils
+
+findingPat=re.compile('^(.+):(\d+):(\w+):(.*)$')
+
+class Analyzer:
+    '''
+    Background static analysis of workspace sources with cppcheck.
+    Findings are cached per file, keyed by a hash of the file contents,
+    so only changed files are analyzed again.  All the files queued
+    while an analysis runs are checked together by a single cppcheck -j
+    '''
+    def __init__(self,root):
+        self.root=root
+        self.cachePath=os.path.join(root,'.intr','analysis.cache')
+        self.cache={}
+        try:
+            self.cache=json.load(open(self.cachePath,'r'))
+        except (IOError,ValueError):
+            pass
+        self.pending=set()
+        self.results={}
+        self.lock=threading.Lock()
+        self.thread=None
+
+    def analyze(self,path):
+        '''
+        Queue a file for analysis
+        '''
+        with self.lock:
+            self.pending.add(path)
+            if not self.thread:
+                self.thread=threading.Thread(target=self.run)
+                self.thread.daemon=True
+                self.thread.start()
+
+    def takeResults(self):
+        '''
+        Returns the findings of the files analyzed since the last call,
+        as {path: [(line,severity,message),...]}
+        '''
+        with self.lock:
+            res=self.results
+            self.results={}
+        return res
+
+    def fileHash(self,path):
+        try:
+            return hashlib.md5(open(path,'rb').read()).hexdigest()
+        except IOError:
+            return ''
+
+    def run(self):
+        while True:
+            with self.lock:
+                paths=self.pending
+                self.pending=set()
+                if len(paths)==0:
+                    self.thread=None
+                    return
+            hashes={}
+            changed=[]
+            for path in paths:
+                h=self.fileHash(path)
+                entry=self.cache.get(path)
+                if entry and entry[0]==h:
+                    with self.lock:
+                        self.results[path]=entry[1]
+                elif h:
+                    hashes[path]=h
+                    changed.append(path)
+            if len(changed)>0:
+                findings=self.check(changed)
+                with self.lock:
+                    for path in changed:
+                        self.cache[path]=[hashes.get(path),findings.get(path,[])]
+                        self.results[path]=findings.get(path,[])
+                self.save()
+
+    def check(self,paths):
+        '''
+        Run cppcheck on a list of files and return their findings
+        '''
+        args=['-j',str(cpu_count()),'-q','--enable=warning,style,performance,portability',
+              '--template={file}:{line}:{severity}:{message}',
+              '-I',os.path.join(self.root,'include')]
+        dirs=set([os.path.dirname(path) for path in paths])
+        for d in dirs:
+            args=args+['-I',d]
+        (out,err)=utils.call(self.root,'cppcheck',*(args+paths))
+        res={}
+        for line in err.split('\n'):
+            m=re.match(findingPat,line.strip())
+            if m:
+                (path,line,severity,msg)=m.groups()
+                path=os.path.abspath(os.path.join(self.root,path))
+                if path in paths:
+                    if not path in res:
+                        res[path]=[]
+                    res.get(path).append((int(line),severity,msg))
+        return res
+
+    def save(self):
+        try:
+            json.dump(self.cache,open(self.cachePath,'w'))
+        except IOError:
+            pass
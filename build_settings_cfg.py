@@ -7,6 +7,7 @@
 #       and the flag that is used if true
 #   3.  'STR' for a single-line string value, followed by the string default
 #   4.  'EDIT' for a multi-line string value, followed by the string default
+# Settings whose name ends with _Release or _Debug only apply to that configuration
 
 tabs={
     'Compile':[
@@ -14,15 +15,31 @@ tabs={
         ('COMPILE_WARN','Warnings','Default|None (-w)|All (-Wall)','Default'),
         ('COMPILE_PEDANTIC','Pedantic','CB',False,'-pedantic-errors'),
         ('COMPILE_WARNERR','Warning as errors','CB',False,'-Werror'),
-        ('COMPILE_CPP_STD','Standard','Default|-std=c++0x|-std=c++11|-std=c++14|-std=c++17','-std=c++11')
+        ('COMPILE_CPP_STD','Standard','Default|-std=c++0x|-std=c++11|-std=c++14|-std=c++17','-std=c++11'),
+        ('COMPILE_SPLIT_DWARF_Debug','Split debug info (Debug)','CB',False,'-gsplit-dwarf'),
+        ('BUILD_LTO_Release','Link time optimization (Release)','Default|Parallel (-flto=auto)','Default')
     ],
     'Link':[
-        ('LINK_PTHREAD','pthread','Default|On (-pthread)','Default')
+        ('LINK_PTHREAD','pthread','Default|On (-pthread)','Default'),
+        ('LINK_LINKER','Linker','Default|bfd (-fuse-ld=bfd)|gold (-fuse-ld=gold)|lld (-fuse-ld=lld)|mold (-fuse-ld=mold)','Default'),
+        ('LINK_GDB_INDEX_Debug','GDB index (Debug)','CB',False,'-Wl,--gdb-index')
     ],
     'Advanced':[
         ('COMPILE_CUSTOM','Custom Compile Flags','EDIT',''),
         ('LINK_CUSTOM','Custom Link Flags','EDIT',''),
-        ('BUILD_WHOLE_ARCHIVE','Whole Archive','CB',False,'')
+        ('BUILD_WHOLE_ARCHIVE','Whole Archive','CB',False,''),
+        ('BUILD_PCH','Precompiled Header','STR',''),
+        ('BUILD_UNITY','Unity Build (sources per unit)','Off|4|8|16|32','Off'),
+        ('BUILD_UNITY_EXCLUDE','Unity Build Excluded Files','STR',''),
+        ('BUILD_SYSTEM','Build System (workspace)','Make|Single Makefile|Ninja','Make'),
+        ('BUILD_LAUNCHER','Compiler Launcher (workspace)','None|ccache|sccache','None'),
+        ('BUILD_REPORT','Build Report (workspace)','CB',False,''),
+        ('BUILD_DEP_SCAN','Scan dependencies when generating','CB',False,'')
     ]
 }
 
+# Settings that are used by the generator itself,
+# and are not added to the compile or link flags
+generatorSettings=['BUILD_SYSTEM','BUILD_DEP_SCAN','BUILD_PCH','BUILD_LAUNCHER','BUILD_REPORT',
+                   'BUILD_UNITY','BUILD_UNITY_EXCLUDE']
+
@@ -0,0 +1,102 @@
+from PyQt4 import QtCore
+from multiprocessing import cpu_count
+
+policies=['Cores','Fixed','Memory']
+
+def availableMemory():
+    '''
+    Returns the available memory in MB, or 0 if it is unknown
+    '''
+    try:
+        for line in open('/proc/meminfo','r'):
+            if line.startswith('MemAvailable:'):
+                return int(line.split()[1])/1024
+    except (IOError,ValueError):
+        pass
+    return 0
+
+class JobSettings:
+    '''
+    The job count policy of parallel builds: all the cores, a fixed
+    number of jobs, or the cores limited by the available memory for
+    each compiler process.  Builds also stop starting jobs while the
+    load average is above the load limit, if it is set.
+
+    The settings are global, unless the workspace overrides them
+    '''
+    def __init__(self,policy='Cores',count=0,memory=1024,load=0):
+        self.policy=policy
+        self.count=count if count>0 else cpu_count()
+        self.memory=memory
+        self.load=load
+
+    def read(self,s):
+        self.policy=s.value('jobs_policy',self.policy).toString()
+        self.count=(s.value('jobs_count',self.count).toInt())[0]
+        self.memory=(s.value('jobs_memory',self.memory).toInt())[0]
+        self.load=(s.value('jobs_load',self.load).toInt())[0]
+
+    def write(self,s):
+        s.setValue('jobs_policy',self.policy)
+        s.setValue('jobs_count',self.count)
+        s.setValue('jobs_memory',self.memory)
+        s.setValue('jobs_load',self.load)
+
+    def jobCount(self):
+        '''
+        Returns the number of jobs of a parallel build
+        '''
+        cores=cpu_count()
+        if self.policy=='Fixed':
+            return max(1,self.count)
+        if self.policy=='Memory':
+            free=availableMemory()
+            if free>0 and self.memory>0:
+                return max(1,min(cores,free/self.memory))
+        return cores
+
+def isWorkspaceOverride(ws):
+    return ws.contains('jobs_policy')
+
+def jobSettings(ws):
+    '''
+    Returns the job settings of a workspace
+    '''
+    js=JobSettings()
+    js.read(QtCore.QSettings())
+    if isWorkspaceOverride(ws):
+        js.read(ws)
+    return js
+
+def save(js,ws,override):
+    '''
+    Save the job settings globally, or only for the workspace
+    '''
+    if override:
+        js.write(ws)
+    else:
+        for key in ['jobs_policy','jobs_count','jobs_memory','jobs_load']:
+            ws.remove(key)
+        s=QtCore.QSettings()
+        js.write(s)
+        s.sync()
+    ws.sync()
+
+def buildLimits(ws):
+    '''
+    Returns the (jobs,load) limits of a build, a single job if
+    parallel builds are disabled
+    '''
+    if not QtCore.QSettings().value('parallel_make',False).toBool():
+        return (1,0)
+    js=jobSettings(ws)
+    return (js.jobCount(),js.load)
+
+def jobArgs(jobs,load):
+    '''
+    Returns the -j/-l arguments of make and ninja
+    '''
+    args=['-j',str(jobs)]
+    if load>0:
+        args.extend(['-l',str(load)])
+    return args
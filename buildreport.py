@@ -0,0 +1,59 @@
+import os
+
+def logPath(root):
+    '''
+    Returns the path of the timing log written by buildtimer.py
+    '''
+    return os.path.join(root,'.intr','build_times.log')
+
+def startBuild(root):
+    '''
+    Clear the timing log before a build
+    '''
+    path=logPath(root)
+    if os.path.exists(path):
+        os.remove(path)
+
+def readTimes(root):
+    '''
+    Returns the logged build steps as {kind: [(seconds,output),...]}
+    '''
+    res={'compile':[],'archive':[],'link':[]}
+    try:
+        lines=open(logPath(root),'r').readlines()
+    except IOError:
+        return res
+    for line in lines:
+        parts=line.rstrip('\n').split('\t')
+        if len(parts)==3 and parts[0] in res:
+            res.get(parts[0]).append((float(parts[1]),parts[2]))
+    return res
+
+def report(root,cfg,top=10):
+    '''
+    Returns the lines of the build report: the slowest objects,
+    the archive and link times, and the most included headers
+    '''
+    times=readTimes(root)
+    compiles=sorted(times.get('compile'),reverse=True)
+    if len(compiles)+len(times.get('archive'))+len(times.get('link'))==0:
+        return []
+    lines=['Build Report']
+    total=sum([t for (t,out) in compiles])
+    lines.append('Compiled {} objects in {:.1f}s'.format(len(compiles),total))
+    for (t,out) in compiles[0:top]:
+        lines.append('  {:8.2f}s  {}'.format(t,os.path.relpath(out,root)))
+    for (kind,title) in [('archive','Archives'),('link','Links')]:
+        steps=sorted(times.get(kind),reverse=True)
+        if len(steps)>0:
+            lines.append(title)
+            for (t,out) in steps:
+                lines.append('  {:8.2f}s  {}'.format(t,os.path.relpath(out,root)))
+    import genmake
+    counts=genmake.getContext(root).includeGraph().fanIn(cfg)
+    if len(counts)>0:
+        lines.append('Most included headers')
+        for (h,n) in counts[0:top]:
+            name=os.path.relpath(h,root) if h.startswith(root) else h
+            lines.append('  {:8d}   {}'.format(n,name))
+    return lines
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+'''
+Command wrapper used by the build report.  Runs a compile, archive
+or link command and appends its wall time to a log file:
+
+    buildtimer.py <log> <command> [args...]
+'''
+import os
+import sys
+import time
+import subprocess
+
+def classify(cmd):
+    '''
+    Returns the (kind,output) of a build command
+    '''
+    if os.path.basename(cmd[0]) in ['ar','gcc-ar'] and len(cmd)>2:
+        return ('archive',cmd[2])
+    out=''
+    if '-o' in cmd and cmd.index('-o')+1<len(cmd):
+        out=cmd[cmd.index('-o')+1]
+    if '-c' in cmd:
+        return ('compile',out)
+    return ('link',out)
+
+def main():
+    log=sys.argv[1]
+    cmd=sys.argv[2:]
+    start=time.time()
+    rc=subprocess.call(cmd)
+    (kind,out)=classify(cmd)
+    line='{}\t{:.3f}\t{}\n'.format(kind,time.time()-start,out)
+    try:
+        # A single append write, so parallel jobs do not mix their lines
+        fd=os.open(log,os.O_WRONLY|os.O_APPEND|os.O_CREAT,0o644)
+        os.write(fd,line.encode('utf8'))
+        os.close(fd)
+    except OSError:
+        pass
+    sys.exit(rc)
+
+if __name__=="__main__":
+    main()
@@ -0,0 +1,59 @@
+import re
+import utils
+
+# Patterns of the hits and misses counters in the statistics output
+# of the supported compiler launchers.  Only the first match of each
+# pattern is used, since ccache 4 repeats the counters per storage
+statsPatterns={
+    'ccache':[
+        # ccache 3
+        (re.compile('^cache hit \((direct|preprocessed)\)\s+(\d+)',re.M),re.compile('^cache miss\s+(\d+)',re.M)),
+        # ccache 4
+        (re.compile('^\s*Hits:\s+(\d+)',re.M),re.compile('^\s*Misses:\s+(\d+)',re.M))
+    ],
+    'sccache':[
+        (re.compile('^Cache hits\s+(\d+)',re.M),re.compile('^Cache misses\s+(\d+)',re.M))
+    ]
+}
+
+def parseStats(launcher,text):
+    '''
+    Returns the (hits,misses) counters found in the statistics
+    output of a launcher, or None if they cannot be found
+    '''
+    for (hitPat,missPat) in statsPatterns.get(launcher,[]):
+        hits=re.findall(hitPat,text)
+        m=re.search(missPat,text)
+        if len(hits)>0 and m:
+            if isinstance(hits[0],tuple):
+                # ccache 3 reports direct and preprocessed hits separately
+                hits=sum([int(h[-1]) for h in hits])
+            else:
+                hits=int(hits[0])
+            return (hits,int(m.group(1)))
+    return None
+
+def readStats(launcher):
+    '''
+    Returns the current (hits,misses) counters of a launcher
+    '''
+    try:
+        (out,err)=utils.call('.',launcher,'-s')
+    except OSError:
+        return None
+    return parseStats(launcher,out)
+
+def report(launcher,before):
+    '''
+    Returns a line describing the cache hits and misses since
+    the `before` counters were read, or an empty string
+    '''
+    after=readStats(launcher)
+    if not after or not before:
+        return ''
+    hits=after[0]-before[0]
+    misses=after[1]-before[1]
+    total=hits+misses
+    if total<=0:
+        return ''
+    return '{}: {} hits, {} misses ({}% hit rate)'.format(launcher,hits,misses,hits*100/total)
@@ -0,0 +1,89 @@
+import os
+import json
+
+class DependencyCache:
+    '''
+    On-disk cache of the header dependencies of a project.
+
+    Each entry is keyed by the full dependency command, which contains
+    both the source path and the effective compile flags, and stores the
+    modification times of the source and all of its headers.
+    An entry is only reused if none of these files changed.
+    '''
+    def __init__(self,path,mtimes=None):
+        self.path=path
+        self.entries={}
+        self.used=set()
+        self.modified=False
+        # Shared memo of file modification times, so headers used by
+        # many sources are only checked once
+        self.mtimes=mtimes if mtimes is not None else {}
+        try:
+            entries=json.load(open(path,'r'))
+        except (IOError,ValueError):
+            entries={}
+        # json returns unicode strings, while the commands and their
+        # output are byte strings, so keep everything in utf-8 bytes
+        for (cmd,entry) in entries.items():
+            self.entries[cmd.encode('utf8')]={
+                'deps':entry.get('deps').encode('utf8'),
+                'mtimes':[(f.encode('utf8'),t) for (f,t) in entry.get('mtimes')]}
+
+    def mtime(self,path):
+        if not path in self.mtimes:
+            try:
+                self.mtimes[path]=os.path.getmtime(path)
+            except OSError:
+                self.mtimes[path]=None
+        return self.mtimes.get(path)
+
+    def valid(self,dir,cmd):
+        '''
+        Check if the cached dependencies of a command are up to date
+        '''
+        entry=self.entries.get(cmd)
+        if not entry:
+            return False
+        for (path,t) in entry.get('mtimes'):
+            cur=self.mtime(os.path.join(dir,path))
+            if cur is None or cur!=t:
+                return False
+        return True
+
+    def get(self,cmd):
+        self.used.add(cmd)
+        return self.entries.get(cmd).get('deps')
+
+    def update(self,dir,cmd,deps):
+        '''
+        Store the dependencies output of a command.  Failed scans
+        are not stored, so they are retried on the next generation
+        '''
+        files=deps[1:].split()
+        if len(files)==0:
+            return
+        mtimes=[]
+        for f in files:
+            t=self.mtime(os.path.join(dir,f))
+            if t is None:
+                return
+            mtimes.append((f,t))
+        self.entries[cmd]={'deps':deps,'mtimes':mtimes}
+        self.modified=True
+
+    def save(self,prune=True):
+        '''
+        Write the cache back.  If prune is set, entries of sources
+        that were not part of this generation are dropped
+        '''
+        if prune:
+            for cmd in self.entries.keys():
+                if not cmd in self.used:
+                    del self.entries[cmd]
+                    self.modified=True
+        if self.modified:
+            try:
+                json.dump(self.entries,open(self.path,'w'))
+                self.modified=False
+            except IOError:
+                pass
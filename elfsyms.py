@@ -0,0 +1,190 @@
+import os
+import mmap
+import struct
+import ctypes
+import ctypes.util
+import subprocess
+
+SHT_SYMTAB=2
+SHT_DYNSYM=11
+SHN_UNDEF=0
+SHN_LORESERVE=0xff00
+STB_GLOBAL=1
+STB_WEAK=2
+STB_GNU_UNIQUE=10
+STT_NOTYPE=0
+STT_OBJECT=1
+STT_FUNC=2
+
+class ElfFile:
+    '''
+    Reads the symbol tables of an ELF file from a buffer, at an offset,
+    which is an archive member when reading a static library
+    '''
+    def __init__(self,buf,base=0):
+        self.buf=buf
+        self.base=base
+        self.sections=[]
+        self.names=[]
+        if buf[base:base+4]!='\x7fELF':
+            return
+        self.is64=buf[base+4]=='\x02'
+        e='<' if buf[base+5]=='\x01' else '>'
+        if self.is64:
+            h=struct.unpack_from(e+'HHIQQQIHHHHHH',buf,base+16)
+            self.shfmt=e+'IIQQQQIIQQ'
+            self.symfmt=e+'IBBHQQ'
+        else:
+            h=struct.unpack_from(e+'HHIIIIIHHHHHH',buf,base+16)
+            self.shfmt=e+'IIIIIIIIII'
+            self.symfmt=e+'IIIBBH'
+        (shoff,shentsize,shnum,shstrndx)=(h[5],h[10],h[11],h[12])
+        for i in xrange(0,shnum):
+            (name,type,flags,addr,offset,size,link,info,align,entsize)=struct.unpack_from(self.shfmt,buf,base+shoff+i*shentsize)
+            self.sections.append((name,type,offset,size,link,entsize))
+        if shstrndx<len(self.sections):
+            strtab=self.sections[shstrndx][2]
+            self.names=[self.string(strtab,s[0]) for s in self.sections]
+        else:
+            self.names=['']*len(self.sections)
+
+    def string(self,table,offset):
+        start=self.base+table+offset
+        return self.buf[start:self.buf.find('\0',start)]
+
+    def symbols(self,sectionType):
+        '''
+        Returns the (name,binding,type,section) of the symbols
+        of the symbol table sections of a type
+        '''
+        res=[]
+        if len(self.sections)==0:
+            return res
+        size=struct.calcsize(self.symfmt)
+        for (name,type,offset,secsize,link,entsize) in self.sections:
+            if type!=sectionType or link>=len(self.sections):
+                continue
+            strtab=self.sections[link][2]
+            for i in xrange(1,secsize/(entsize or size)):
+                sym=struct.unpack_from(self.symfmt,self.buf,self.base+offset+i*(entsize or size))
+                if self.is64:
+                    (symname,info,other,shndx)=sym[0:4]
+                else:
+                    (symname,info,other,shndx)=(sym[0],sym[3],sym[4],sym[5])
+                res.append((self.string(strtab,symname),info>>4,info&0xf,shndx))
+        return res
+
+    def sectionKind(self,index):
+        '''
+        Returns the kind of a section, 'text' for .text and .text.name
+        '''
+        if index>=len(self.names):
+            return ''
+        parts=self.names[index].split('.')
+        return parts[1] if len(parts)>1 and parts[0]=='' else ''
+
+    def definedSymbols(self,sectionType,sectionNames=None):
+        '''
+        Returns the names of the global functions and variables defined
+        in the file, optionally only those in sections of some names
+        '''
+        res=[]
+        for (name,binding,type,shndx) in self.symbols(sectionType):
+            if not name or shndx==SHN_UNDEF or shndx>=SHN_LORESERVE:
+                continue
+            if not binding in [STB_GLOBAL,STB_WEAK,STB_GNU_UNIQUE] or not type in [STT_NOTYPE,STT_OBJECT,STT_FUNC]:
+                continue
+            if sectionNames and not self.sectionKind(shndx) in sectionNames:
+                continue
+            res.append(name)
+        return res
+
+def archiveMembers(buf):
+    '''
+    Returns the offsets of the members of an ar archive.
+    The symbol index and the long names table are skipped
+    '''
+    res=[]
+    if buf[0:8]!='!<arch>\n':
+        return res
+    pos=8
+    while pos+60<=len(buf):
+        name=buf[pos:pos+16].strip()
+        try:
+            size=int(buf[pos+48:pos+58].strip())
+        except ValueError:
+            break
+        if not name in ['/','//','/SYM64/']:
+            res.append(pos+60)
+        pos=pos+60+size+(size&1)
+    return res
+
+def mapFile(path):
+    f=open(path,'rb')
+    try:
+        if os.fstat(f.fileno()).st_size==0:
+            return ''
+        return mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ)
+    finally:
+        f.close()
+
+def archiveSymbols(path):
+    '''
+    Returns the mangled names of the text and bss symbols defined
+    by the objects of a static library
+    '''
+    buf=mapFile(path)
+    res=[]
+    for offset in archiveMembers(buf):
+        res.extend(ElfFile(buf,offset).definedSymbols(SHT_SYMTAB,['text','bss']))
+    return res
+
+def sharedSymbols(path):
+    '''
+    Returns the mangled names of the dynamic symbols defined by a shared library
+    '''
+    return ElfFile(mapFile(path)).definedSymbols(SHT_DYNSYM)
+
+cxxabi=None
+libc=None
+
+def loadDemangler():
+    global cxxabi
+    global libc
+    if cxxabi is None:
+        try:
+            cxxabi=ctypes.CDLL(ctypes.util.find_library('stdc++') or 'libstdc++.so.6')
+            cxxabi.__cxa_demangle.restype=ctypes.c_void_p
+            libc=ctypes.CDLL(ctypes.util.find_library('c'))
+        except (OSError,AttributeError):
+            cxxabi=False
+    return cxxabi
+
+def demangle(names):
+    '''
+    Returns the demangled names, with the runtime library demangler,
+    or else with a single c++filt for all the names
+    '''
+    abi=loadDemangler()
+    if not abi:
+        try:
+            p=subprocess.Popen(['c++filt'],stdin=subprocess.PIPE,stdout=subprocess.PIPE)
+            out=p.communicate('\n'.join(names))[0].split('\n')
+            if len(out)>=len(names):
+                return out[0:len(names)]
+        except OSError:
+            pass
+        return names
+    res=[]
+    status=ctypes.c_int()
+    for name in names:
+        if not name.startswith('_Z'):
+            res.append(name)
+            continue
+        p=abi.__cxa_demangle(ctypes.c_char_p(name),None,None,ctypes.byref(status))
+        if p and status.value==0:
+            res.append(ctypes.string_at(p))
+            libc.free(ctypes.c_void_p(p))
+        else:
+            res.append(name)
+    return res
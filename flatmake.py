@@ -0,0 +1,71 @@
+import os
+from genmake import objectRule, pchRule, pchFlags, pchDepfile
+
+def writeFragment(path,configs):
+    '''
+    Write the rules of a project, in all its configurations, as a
+    fragment of the single workspace Makefile.  All the variables
+    are prefixed by the project name, so fragments can be included together
+    '''
+    o=open(path,'w')
+    for pc in configs:
+        key=pc.key()
+        o.write('# {} ({})\n'.format(pc.rel,pc.cfg))
+        o.write('CPP_{}={}\n'.format(key,pc.cpp))
+        o.write('OPT_{}={} $(USER_OPT)\n'.format(key,pc.opt))
+        o.write('INC_{}={}\n'.format(key,pc.inc))
+        depflags=' -MMD -MP' if pc.depfiles else ''
+        o.write('CFLAGS_{0}=-c $(OPT_{0}) $(INC_{0}) {1}{2}\n'.format(key,pc.cflags,depflags))
+        o.write('LFLAGS_{0}=$(OPT_{0}) $(OBJS_{0}) {1}\n'.format(key,pc.lflags))
+        if pc.gch:
+            o.write('PCH_{}={}\n'.format(key,pchFlags(pc.gch)))
+        o.write('OBJS_{}='.format(key))
+        for obj in pc.objs:
+            o.write('\\\n'+obj)
+        o.write('\n\n')
+        if pc.type=='LIB':
+            o.write('{}: $(OBJS_{})\n'.format(pc.outfile,key))
+            o.write('\t{} cr {} $(OBJS_{})\n\n'.format(pc.ar,pc.outfile,key))
+        else:
+            o.write('{}: $(OBJS_{}) {}\n'.format(pc.outfile,key,' '.join(pc.libfiles)))
+            o.write('\t$(CPP_{0}) -o {1} $(LFLAGS_{0})\n\n'.format(key,pc.outfile))
+        o.write('{}: {}\n\n'.format(pc.target(),pc.outfile))
+        outfile=pc.outfile
+        if pc.depfiles:
+            outfile='$(OBJS_{}:.o=.d) {}'.format(key,outfile)
+        if '-gsplit-dwarf' in pc.cflags:
+            outfile='$(OBJS_{}:.o=.dwo) {}'.format(key,outfile)
+        if pc.gch:
+            outfile='{} {}'.format(outfile,pc.gch)
+            if pc.depfiles:
+                outfile='{} {}'.format(outfile,pchDepfile(pc.gch))
+        o.write('clean_{}:\n\t@rm -f $(OBJS_{}) {}\n\n'.format(pc.target(),key,outfile))
+        o.write('.PHONY: {0} clean_{0}\n\n'.format(pc.target()))
+        for (src,obj,deps) in zip(pc.srcs,pc.objs,pc.deps):
+            src=os.path.join(pc.absdir,src)
+            o.write(objectRule(key,obj,deps,src,pc.gch))
+        if pc.gch:
+            o.write(pchRule(key,pc.gch,pc.pchdeps,pc.pch))
+        if pc.depfiles:
+            o.write('-include $(OBJS_{}:.o=.d)\n\n'.format(key))
+            if pc.gch:
+                o.write('-include {}\n\n'.format(pchDepfile(pc.gch)))
+    o.close()
+
+def writeWorkspaceMakefile(path,fragments,projects):
+    '''
+    Write the non-recursive workspace Makefile, which includes
+    all the project fragments, so a single make can schedule
+    the objects of all projects together
+    '''
+    o=open(path,'w')
+    o.write('default: Release\n\n')
+    o.write('clean: clean_Release\n\n')
+    for cfg in ['Release','Debug']:
+        targets=['{}_{}'.format(p,cfg) for p in projects]
+        o.write('{}: {}\n\n'.format(cfg,' '.join(targets)))
+        o.write('clean_{}: {}\n\n'.format(cfg,' '.join(['clean_'+t for t in targets])))
+    o.write('.PHONY: default clean Release Debug clean_Release clean_Debug\n\n')
+    for f in fragments:
+        o.write('include {}\n'.format(f))
+    o.close()
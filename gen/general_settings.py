@@ -40,6 +40,47 @@ class Ui_EditorSettingsDialog(object):
         EditorSettingsDialog.customPrinters = QtGui.QCheckBox(EditorSettingsDialog)
         EditorSettingsDialog.customPrinters.setGeometry(QtCore.QRect(10, 50, 201, 20))
         EditorSettingsDialog.customPrinters.setObjectName(_fromUtf8("customPrinters"))
+        EditorSettingsDialog.jobsLabel = QtGui.QLabel(EditorSettingsDialog)
+        EditorSettingsDialog.jobsLabel.setGeometry(QtCore.QRect(10, 140, 131, 22))
+        EditorSettingsDialog.jobsLabel.setObjectName(_fromUtf8("jobsLabel"))
+        EditorSettingsDialog.jobsPolicyCB = QtGui.QComboBox(EditorSettingsDialog)
+        EditorSettingsDialog.jobsPolicyCB.setGeometry(QtCore.QRect(150, 136, 161, 27))
+        EditorSettingsDialog.jobsPolicyCB.setObjectName(_fromUtf8("jobsPolicyCB"))
+        EditorSettingsDialog.jobsCountLabel = QtGui.QLabel(EditorSettingsDialog)
+        EditorSettingsDialog.jobsCountLabel.setGeometry(QtCore.QRect(10, 176, 131, 22))
+        EditorSettingsDialog.jobsCountLabel.setObjectName(_fromUtf8("jobsCountLabel"))
+        EditorSettingsDialog.jobsCount = QtGui.QSpinBox(EditorSettingsDialog)
+        EditorSettingsDialog.jobsCount.setGeometry(QtCore.QRect(150, 172, 81, 27))
+        EditorSettingsDialog.jobsCount.setMinimum(1)
+        EditorSettingsDialog.jobsCount.setMaximum(256)
+        EditorSettingsDialog.jobsCount.setObjectName(_fromUtf8("jobsCount"))
+        EditorSettingsDialog.jobsMemoryLabel = QtGui.QLabel(EditorSettingsDialog)
+        EditorSettingsDialog.jobsMemoryLabel.setGeometry(QtCore.QRect(10, 212, 131, 22))
+        EditorSettingsDialog.jobsMemoryLabel.setObjectName(_fromUtf8("jobsMemoryLabel"))
+        EditorSettingsDialog.jobsMemory = QtGui.QSpinBox(EditorSettingsDialog)
+        EditorSettingsDialog.jobsMemory.setGeometry(QtCore.QRect(150, 208, 81, 27))
+        EditorSettingsDialog.jobsMemory.setMinimum(128)
+        EditorSettingsDialog.jobsMemory.setMaximum(65536)
+        EditorSettingsDialog.jobsMemory.setSingleStep(256)
+        EditorSettingsDialog.jobsMemory.setObjectName(_fromUtf8("jobsMemory"))
+        EditorSettingsDialog.jobsLoadLabel = QtGui.QLabel(EditorSettingsDialog)
+        EditorSettingsDialog.jobsLoadLabel.setGeometry(QtCore.QRect(10, 248, 131, 22))
+        EditorSettingsDialog.jobsLoadLabel.setObjectName(_fromUtf8("jobsLoadLabel"))
+        EditorSettingsDialog.jobsLoad = QtGui.QSpinBox(EditorSettingsDialog)
+        EditorSettingsDialog.jobsLoad.setGeometry(QtCore.QRect(150, 244, 81, 27))
+        EditorSettingsDialog.jobsLoad.setMaximum(1024)
+        EditorSettingsDialog.jobsLoad.setObjectName(_fromUtf8("jobsLoad"))
+        EditorSettingsDialog.workspaceJobsCB = QtGui.QCheckBox(EditorSettingsDialog)
+        EditorSettingsDialog.workspaceJobsCB.setGeometry(QtCore.QRect(10, 284, 321, 27))
+        EditorSettingsDialog.workspaceJobsCB.setObjectName(_fromUtf8("workspaceJobsCB"))
+        EditorSettingsDialog.outputLinesLabel = QtGui.QLabel(EditorSettingsDialog)
+        EditorSettingsDialog.outputLinesLabel.setGeometry(QtCore.QRect(10, 324, 131, 22))
+        EditorSettingsDialog.outputLinesLabel.setObjectName(_fromUtf8("outputLinesLabel"))
+        EditorSettingsDialog.outputLines = QtGui.QSpinBox(EditorSettingsDialog)
+        EditorSettingsDialog.outputLines.setGeometry(QtCore.QRect(150, 320, 101, 27))
+        EditorSettingsDialog.outputLines.setMaximum(10000000)
+        EditorSettingsDialog.outputLines.setSingleStep(10000)
+        EditorSettingsDialog.outputLines.setObjectName(_fromUtf8("outputLines"))
 
         self.retranslateUi(EditorSettingsDialog)
         QtCore.QObject.connect(EditorSettingsDialog.buttonBox, QtCore.SIGNAL(_fromUtf8("accepted()")), EditorSettingsDialog.accept)
@@ -51,4 +92,12 @@ class Ui_EditorSettingsDialog(object):
         EditorSettingsDialog.sortFilesCB.setText(_translate("EditorSettingsDialog", "Sort by File name", None))
         EditorSettingsDialog.clearCacheButton.setText(_translate("EditorSettingsDialog", "Clear Cache", None))
         EditorSettingsDialog.customPrinters.setText(_translate("EditorSettingsDialog", "Use custom gdb printers", None))
+        EditorSettingsDialog.jobsLabel.setText(_translate("EditorSettingsDialog", "Parallel Jobs", None))
+        EditorSettingsDialog.jobsCountLabel.setText(_translate("EditorSettingsDialog", "Fixed Jobs", None))
+        EditorSettingsDialog.jobsMemoryLabel.setText(_translate("EditorSettingsDialog", "MB per Job", None))
+        EditorSettingsDialog.jobsLoadLabel.setText(_translate("EditorSettingsDialog", "Max Load", None))
+        EditorSettingsDialog.jobsLoad.setSpecialValueText(_translate("EditorSettingsDialog", "None", None))
+        EditorSettingsDialog.workspaceJobsCB.setText(_translate("EditorSettingsDialog", "Workspace specific jobs", None))
+        EditorSettingsDialog.outputLinesLabel.setText(_translate("EditorSettingsDialog", "Output Lines", None))
+        EditorSettingsDialog.outputLines.setSpecialValueText(_translate("EditorSettingsDialog", "Unlimited", None))
 
@@ -1,11 +1,17 @@
 #!/usr/bin/env python
 import os
 import re
+import sys
+import fnmatch
 from properties import Properties
+from depcache import DependencyCache
+from includegraph import IncludeGraph, indexPath
 from system import listAllPackages
 import utils
 import templates
 from threading import Thread
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
 from globals import is_src_ext, src_exts
 
 
@@ -82,12 +88,6 @@ def filterSources(files):
             alt.append(f)
     return alt
     
-def arreplace(a,fr,to):
-    res=[]
-    for s in a:
-        res.append(s.replace(fr,to))
-    return res
-
 def verifyDir(dir):
     '''
     Check if a directory exists, and if not, create it
@@ -101,22 +101,84 @@ def isSourceFile(f):
     '''
     return is_src_ext(f)
 
+mainPat=re.compile('^(int|void)( )+main( )*\(')
+def hasMain(path):
+    '''
+    Check if a source file has the `main` function
+    '''
+    lines=open(path,"r").readlines()
+    for line in lines:
+        if re.search(mainPat,line.strip()):
+            return True
+    return False
+
 def findMain(dir):
     '''
     Search the directory for a source file that
     has the `main` function
     '''
-    pat=re.compile('^(int|void)( )+main( )*\(')
     files=os.listdir(dir)
     for f in files:
         if isSourceFile(f):
-            path=os.path.join(dir,f)
-            lines=open(path,"r").readlines()
-            for line in lines:
-                if re.search(pat,line.strip()):
-                    return True
+            if hasMain(os.path.join(dir,f)):
+                return True
     return False
 
+def objectName(src):
+    '''
+    Returns the object file name of a source file
+    '''
+    for e in src_exts:
+        src=src.replace(e,'.o')
+    return src
+
+def objectRule(cfg,obj,deps,src,gch=''):
+    '''
+    Returns the make rule that compiles a single object file.
+    If a precompiled header is given, the object depends on it
+    '''
+    flags='$(CFLAGS_{})'.format(cfg)
+    if gch:
+        deps=deps.rstrip('\n')+' {}\n'.format(gch)
+        flags=flags+' $(PCH_{})'.format(cfg)
+    rule='{}{}'.format(obj,deps)
+    rule=rule+'\t$(CPP_{}) {} -o {} {}\n\n'.format(cfg,flags,obj,src)
+    return rule
+
+def writeUnit(path,srcs):
+    '''
+    Write a unity build source that includes all the given sources.
+    The file is only written if its contents changed, so that
+    its object is not needlessly rebuilt
+    '''
+    text=''.join(['#include "{}"\n'.format(src) for src in srcs])
+    if os.path.exists(path) and open(path,'r').read()==text:
+        return
+    o=open(path,'w')
+    o.write(text)
+    o.close()
+
+def pchRule(cfg,gch,deps,header):
+    '''
+    Returns the make rule that precompiles the header of a project
+    '''
+    rule='{}{}'.format(gch,deps)
+    rule=rule+'\t$(CPP_{0}) $(CFLAGS_{0}) -x c++-header -o {1} {2}\n\n'.format(cfg,gch,header)
+    return rule
+
+def pchFlags(gch):
+    '''
+    Returns the flags that use a precompiled header in all sources
+    '''
+    return '-include {} -Winvalid-pch'.format(gch[0:-len('.gch')])
+
+def pchDepfile(gch):
+    '''
+    Returns the dependency file written by the compiler (-MMD)
+    when precompiling a header
+    '''
+    return os.path.splitext(gch)[0]+'.d'
+
 flagsPat=re.compile('\((.+)\)')
 def extractFlags(s):
     m=re.search(flagsPat,s)
@@ -140,36 +202,318 @@ def fillStdIncludes():
             if found:
                 stdIncludes.append(line)
 
+# Flags that can change the result of preprocessing, and therefore
+# the set of headers a source depends on
+ppArgFlags=['-I','-D','-U','-include','-imacros','-isystem','-iquote','-idirafter']
+# Code generation and target flags that define macros.  Others, such as
+# -flto or -fomit-frame-pointer, do not change the dependencies
+ppMacroFlags=['-fopenmp','-fPIC','-fpic','-fPIE','-fpie','-fexceptions','-fno-exceptions',
+              '-frtti','-fno-rtti','-fsigned-char','-funsigned-char','-fshort-wchar',
+              '-ffast-math','-fsanitize=','-fstack-protector','-fcoroutines','-fconcepts',
+              '-fms-extensions','-fno-operator-names','-fno-gnu-keywords',
+              '-march=','-mtune=','-mcpu=','-mfpu=','-mfloat-abi=','-mthumb','-marm',
+              '-m32','-m64','-mx32','-msse','-mavx','-mfma','-mbmi','-mpopcnt']
+ppFlagPrefixes=ppArgFlags+['-std=','-ansi','-nostdinc','-pthread','`']+ppMacroFlags
+flagTokenPat=re.compile('`[^`]*`|\S+')
+
+def preprocessorFlags(flags):
+    '''
+    Keep only the flags that affect preprocessing, so that configurations
+    that differ only in optimization or debug flags share their dependencies
+    '''
+    res=[]
+    tokens=re.findall(flagTokenPat,flags)
+    i=0
+    while i<len(tokens):
+        t=tokens[i]
+        if t in ppArgFlags and (i+1)<len(tokens):
+            res.append(t+' '+tokens[i+1])
+            i=i+1
+        else:
+            for prefix in ppFlagPrefixes:
+                if t.startswith(prefix):
+                    res.append(t)
+                    break
+        i=i+1
+    return ' '.join(res)
+
+depPool=None
+
+def dependencyPool():
+    '''
+    Returns the worker pool used to run the header dependency
+    scans, sized to the number of cores
+    '''
+    global depPool
+    if depPool is None:
+        depPool=ThreadPool(cpu_count())
+    return depPool
+
+def scanDependencies(dir,depcmd):
+    '''
+    Run a `g++ -MM` command and return the dependencies part
+    of its output, starting at the colon
+    '''
+    (out,err)=utils.shellcall(dir,depcmd)
+    p=out.find(':')
+    if p>0:
+        return out[p:].replace('\\\n','')
+    return ':\n'
+
+def scanAllDependencies(dir,depcmds):
+    '''
+    Run all dependency commands in parallel.  Results are
+    returned in the same order as the commands
+    '''
+    if len(depcmds)<2:
+        return [scanDependencies(dir,cmd) for cmd in depcmds]
+    return dependencyPool().map(lambda cmd: scanDependencies(dir,cmd),depcmds)
+
+def getmtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+class GeneratorContext:
+    '''
+    Workspace information that is kept between generations:
+    directory listings, project types, tools availability
+    and the include graph of the workspace objects.
+    Directories are only listed again when their modification time
+    changes, and project types are only detected again when the
+    directory, its mk.cfg or one of its sources change
+    '''
+    def __init__(self,root):
+        self.root=root
+        self.listings={}
+        self.types={}
+        self.tools={}
+        self.graph=IncludeGraph()
+
+    def includeGraph(self):
+        '''
+        Returns the include graph, loaded once from its saved index,
+        or from the generated Makefiles if there is no index yet
+        '''
+        with self.graph.lock:
+            if not self.graph.loaded:
+                self.graph.loadWorkspace(self.root)
+        return self.graph
+
+    def updateIncludeGraph(self):
+        '''
+        Read the dependency files written since the graph was last
+        updated, and save its index.  Called when a generation or a
+        build finishes, not for each lookup
+        '''
+        graph=self.includeGraph()
+        graph.refresh()
+        self.saveGraph()
+
+    def saveGraph(self):
+        if os.path.exists(os.path.join(self.root,'.intr')):
+            self.graph.save(indexPath(self.root))
+
+    def tool(self,name):
+        if not name in self.tools:
+            self.tools[name]=utils.checkFor(name)
+        return self.tools.get(name)
+
+    def listDir(self,dir):
+        '''
+        Returns the (subdirs,files) lists of a directory
+        '''
+        t=getmtime(dir)
+        if t is None:
+            return ([],[])
+        entry=self.listings.get(dir)
+        if entry and entry[0]==t:
+            return entry[1]
+        subdirs=[]
+        files=[]
+        for name in os.listdir(dir):
+            if os.path.isdir(os.path.join(dir,name)):
+                subdirs.append(name)
+            else:
+                files.append(name)
+        self.listings[dir]=(t,(subdirs,files))
+        return (subdirs,files)
+
+    def walk(self,top):
+        '''
+        Same as os.walk, using the cached directory listings
+        '''
+        (subdirs,files)=self.listDir(top)
+        subdirs=list(subdirs)
+        yield (top,subdirs,list(files))
+        for sd in subdirs:
+            path=os.path.join(top,sd)
+            if not os.path.islink(path):
+                for res in self.walk(path):
+                    yield res
+
+    def projectType(self,dir):
+        '''
+        Returns the TYPE of a project, either set in its mk.cfg
+        or detected by searching for the `main` function
+        '''
+        mkPath=os.path.join(dir,'mk.cfg')
+        srcs=[os.path.join(dir,f) for f in self.listDir(dir)[1] if isSourceFile(f)]
+        stamp=[getmtime(path) for path in [dir,mkPath]+srcs]
+        entry=self.types.get(dir)
+        if entry and entry[0]==stamp:
+            return entry[1]
+        type=Properties(mkPath).get("TYPE")
+        if type=="":
+            type="LIB"
+            for path in srcs:
+                if hasMain(path):
+                    type="APP"
+                    break
+        self.types[dir]=(stamp,type)
+        return type
+
+class ProjectConfig:
+    '''
+    Build description of a project in a single configuration,
+    shared by the Makefile and ninja writers
+    '''
+    def __init__(self,dir,cfg):
+        self.dir=dir
+        self.cfg=cfg
+        self.name=os.path.basename(dir)
+        self.absdir=os.path.abspath(dir)
+        self.rel=''
+        self.intr=''
+        self.type=''
+        self.inc=''
+        self.opt=''
+        self.cflags=''
+        self.lflags=''
+        self.srcs=[]
+        self.objs=[]
+        self.libdeps={}
+        self.libfiles=[]
+        self.outfile=''
+        # Number of sources in each unity build source, 0 if not used
+        self.unity=0
+        # Compiler command, including the launcher if any
+        self.cpp='g++'
+        # Archiver, gcc-ar is needed for link time optimized objects
+        self.ar='ar'
+        self.deps=[]
+        # Precompiled header source and output, if used
+        self.pch=''
+        self.gch=''
+        self.pchdeps=''
+        # Use compiler generated dependency files, instead of
+        # scanning the dependencies when generating
+        self.depfiles=True
+
+    def key(self):
+        '''
+        Returns a unique name of the project configuration,
+        usable in make and ninja variable names
+        '''
+        return re.sub('[^A-Za-z0-9_]','_',self.rel)+'_'+self.cfg
+
+    def target(self):
+        return '{}_{}'.format(self.rel,self.cfg)
+
+def buildSystem(root):
+    '''
+    Returns the build system selected for the workspace:
+    Make, Single Makefile or Ninja
+    '''
+    return Properties(os.path.join(root,'mk.cfg')).get('BUILD_SYSTEM','Make')
+
+def compilerLauncher(root):
+    '''
+    Returns the compiler launcher (ccache, sccache) selected
+    for the workspace, or an empty string
+    '''
+    launcher=Properties(os.path.join(root,'mk.cfg')).get('BUILD_LAUNCHER','None')
+    if launcher=='None':
+        return ''
+    return launcher
+
+def buildReport(root):
+    '''
+    Check if build steps are timed for the build report
+    '''
+    return Properties(os.path.join(root,'mk.cfg')).get('BUILD_REPORT')=='True'
+
+def buildTimer(root):
+    '''
+    Returns the command prefix that logs the time of a build step
+    '''
+    import buildreport
+    script=os.path.join(os.path.dirname(os.path.abspath(__file__)),'buildtimer.py')
+    return '{} {} {}'.format(sys.executable,script,buildreport.logPath(root))
+
+def projectTarget(root,dir,cfg):
+    '''
+    Returns the name of the workspace level target that builds a project.
+    The workspace root itself builds all projects
+    '''
+    rel=os.path.relpath(dir,os.path.join(root,'src'))
+    if rel.startswith('..'):
+        return cfg
+    return '{}_{}'.format(rel,cfg)
+
+def workspaceLibraries(root):
+    '''
+    Returns the directories of the workspace libraries, by name
+    '''
+    context=getContext(root)
+    res={}
+    for dir,subdirs,files in context.walk(os.path.join(root,'src')):
+        if isSourceDir(dir,files) and context.projectType(dir)=="LIB":
+            res[os.path.basename(dir)]=dir
+    return res
+
+def projectLibraries(root,dir):
+    '''
+    Returns the directories of the workspace libraries
+    that a project links with (LINK_LIBS)
+    '''
+    wsLibs=workspaceLibraries(root)
+    libs=re.split(',| ',Properties(os.path.join(dir,"mk.cfg")).get("LINK_LIBS"))
+    return [wsLibs.get(lib) for lib in libs if lib in wsLibs]
+
+contexts={}
+
+def getContext(root):
+    if not root in contexts:
+        contexts[root]=GeneratorContext(root)
+    return contexts.get(root)
+
 class Generator:
     def __init__(self,root):
         if len(stdIncludes)==0:
             fillStdIncludes()
         self.root=root
+        self.context=getContext(root)
         self.globalInc=os.path.join(root,'include')
         self.srcDir=os.path.join(root,'src')
         self.intrDir=os.path.join(root,'.intr')
         self.outDir=os.path.join(root,'out')
+        self.mtimes={}
+        self.depCache=None
         self.scanWorkspace()
-        self.cppcheck=utils.checkFor('cppcheck')
+        self.context.includeGraph()
+        self.cppcheck=self.context.tool('cppcheck')
+        self.launcher=compilerLauncher(root)
+        if self.launcher and not self.context.tool(self.launcher):
+            self.launcher=''
+        self.timer=buildTimer(root) if buildReport(root) else ''
         
     def scanWorkspace(self):
         self.wsLibs={}
-        for dir,subdirs,files in os.walk(self.srcDir):
-            type=""
-            if isSourceDir(dir,files):
-                mkPath=os.path.join(dir,'mk.cfg')
-                if os.path.exists(mkPath):
-                    props=Properties(mkPath)
-                    if props.has("TYPE"):
-                        type=props.get("TYPE")
-                if type=="":
-                    if findMain(dir):
-                        type="APP"
-                    else:
-                        type="LIB"
-                if type=="LIB":
-                    dirname=(dir.split('/'))[-1]
-                    self.wsLibs[dirname]=os.path.relpath(dir,self.srcDir)
+        libs=workspaceLibraries(self.root)
+        for name in libs:
+            self.wsLibs[name]=os.path.relpath(libs.get(name),self.srcDir)
                     
     def findAllSubdirs(self,files):
         res=[]
@@ -179,17 +523,56 @@ class Generator:
                 res.append(d)
         return res
         
+    def dependencies(self,dir,depcmds):
+        '''
+        Returns the dependencies of each command.  The compiler is only
+        called for commands that are missing or stale in the cache
+        '''
+        stale=[]
+        for cmd in depcmds:
+            if not cmd in stale and not self.depCache.valid(dir,cmd):
+                stale.append(cmd)
+        for (cmd,deps) in zip(stale,scanAllDependencies(dir,stale)):
+            self.depCache.update(dir,cmd,deps)
+        res=[]
+        for cmd in depcmds:
+            if self.depCache.valid(dir,cmd):
+                res.append(self.depCache.get(cmd))
+            else:
+                res.append(':\n')
+        return res
+
+    def settingAvailable(self,name,flag,props):
+        '''
+        Check if the tools needed by a setting flag are installed.
+        A linker is only used if present, and the gdb index is only
+        created by the gold, lld and mold linkers
+        '''
+        if name=='LINK_LINKER':
+            return self.context.tool('ld.'+flag.split('=')[-1])
+        if name.startswith('LINK_GDB_INDEX'):
+            linker=extractFlags(props.get('LINK_LINKER'))
+            if linker=='' or linker=='-fuse-ld=bfd':
+                return False
+            return self.settingAvailable('LINK_LINKER',linker,props)
+        return True
+
     def addSettings(self,flags,props,cfg,prefix):
-        from build_settings_cfg import tabs
+        from build_settings_cfg import tabs, generatorSettings
         parenPat=re.compile('.+\((.+)\)')
         for t in tabs:
             desc=tabs.get(t)
             for d in desc:
                 name=d[0]
+                if name in generatorSettings:
+                    continue
+                suffix=name.split('_')[-1]
+                if suffix in ['Release','Debug'] and suffix!=cfg:
+                    continue
                 if name.startswith(prefix) or name.startswith('BUILD_'):
                     value=props.get(name)
                     if d[2]=='CB':
-                        if value=='True':
+                        if value=='True' and self.settingAvailable(name,d[4],props):
                             flags=flags+' '+d[4]
                     else:
                         if value and not value=='Default':
@@ -199,7 +582,8 @@ class Generator:
                                 value=g[0]
                             else:
                                 value=value.replace('\\n',' ')
-                            flags=flags+' '+value
+                            if self.settingAvailable(name,value,props):
+                                flags=flags+' '+value
         return flags
         
     def addCompileSettings(self,cflags,props,cfg):
@@ -208,50 +592,30 @@ class Generator:
     def addLinkSettings(self,lflags,props,cfg):
         return self.addSettings(lflags,props,cfg,'LINK_')
 
-    def generateConfig(self,dir,files,cfg,o,props):
+    def configure(self,dir,files,cfg,props):
         '''
-        Generate rules for a configuration (Debug/Release)
+        Collect the build description of a project configuration (Debug/Release)
         '''
-        name=os.path.basename(dir)
-        absdir=os.path.abspath(dir)
+        pc=ProjectConfig(dir,cfg)
+        pc.rel=os.path.relpath(dir,self.srcDir)
         pb=Properties(os.path.join(dir,"mk.cfg"))
-        type=pb.get("TYPE")
-        if len(type)==0: 
-            if findMain(absdir):
-                type="APP"
-            else:
-                type="LIB"
-        o.write('TYPE={}\n'.format(type))
+        pc.type=self.context.projectType(pc.absdir)
         libs=re.split(',| ',pb.get("LINK_LIBS"))
         libs=filter(bool,libs)  # remove empty strings
-        if len(type)==0:
-            return False
-        srcs=filterSources(files)
-        subdirs=self.findAllSubdirs(srcs)
+        pc.srcs=filterSources(files)
+        subdirs=self.findAllSubdirs(pc.srcs)
         intr=os.path.join(dir.replace(self.srcDir,self.intrDir),cfg)
+        pc.intr=intr
         verifyDir(intr)
         for sd in subdirs:
             verifyDir(os.path.join(intr,sd))
         outdir=os.path.join(dir.replace(self.srcDir,self.outDir),cfg)
         verifyDir(outdir)
-        #reloutdir=os.path.relpath(outdir,dir)
-        reloutdir=outdir
         #globalInclude=os.path.relpath(self.globalInc,dir)
         cfgInclude=''
-        
-        #o = open(output,'w')
-        mkProps=Properties()
-        o.write('CPP_{}=g++\n'.format(cfg))
-        mkProps.assign('CPP_{}'.format(cfg),'g++')
-        o.write('INC_{}=-I{} {}\n'.format(cfg,self.globalInc,cfgInclude))
-        mkProps.assign('INC_{}'.format(cfg),'-I{} {}'.format(self.globalInc,cfgInclude))
-
-        cflags='-c $(OPT_{}) $(INC_{}) '.format(cfg,cfg)
-        cflags=self.addCompileSettings(cflags,props,cfg)
-        
-        lflags='$(OPT_{}) $(OBJS_{}) '.format(cfg,cfg)
-        lflags=self.addLinkSettings(lflags,props,cfg)
-        libdeps={}
+        pc.inc='-I{} {}'.format(self.globalInc,cfgInclude)
+        cflags=self.addCompileSettings('',props,cfg)
+        lflags=self.addLinkSettings('',props,cfg)
         for stage in ['local','package']:
             for lib in libs:
                 if lib in packages:
@@ -271,17 +635,92 @@ class Generator:
                                 wPrefix=' -Wl,--whole-archive'
                                 wSuffix='-Wl,--no-whole-archive '
                             lflags=lflags+'{} -L{} -l{} {}'.format(wPrefix,libdir,lib,wSuffix)
-                            libdeps[lib]=libDir
+                            pc.libdeps[lib]=libDir
+                            pc.libfiles.append(os.path.join(libdir,'lib{}.a'.format(lib)))
                     else:
                         if stage=='package':
                             lflags=lflags+' -l{} '.format(lib)
+        pc.cflags=cflags
+        pc.lflags=lflags
+        if '-flto' in cflags:
+            pc.ar='gcc-ar'
+        pc.depfiles=(props.get('BUILD_DEP_SCAN')!='True')
+        try:
+            pc.unity=max(0,int(props.get('BUILD_UNITY','Off')))
+        except ValueError:
+            # Off, or a hand edited value that is not a number
+            pc.unity=0
+        if pc.unity:
+            pc.srcs=self.unitySources(pc,intr,props.get('BUILD_UNITY_EXCLUDE'))
+        pc.objs=[os.path.join(intr,objectName(src)) for src in pc.srcs]
+        pch=props.get('BUILD_PCH')
+        if pch and os.path.exists(os.path.join(pc.absdir,pch)):
+            pc.pch=os.path.join(pc.absdir,pch)
+            pc.gch=os.path.join(intr,os.path.basename(pch)+'.gch')
+        if self.launcher:
+            pc.cpp='{} g++'.format(self.launcher)
+        if self.timer:
+            pc.cpp='{} {}'.format(self.timer,pc.cpp)
+            pc.ar='{} {}'.format(self.timer,pc.ar)
+        if self.launcher=='ccache' and pc.gch:
+            # Required by ccache to cache sources using a precompiled header
+            pc.cpp='CCACHE_SLOPPINESS=pch_defines,time_macros '+pc.cpp
+        if pc.type=='LIB':
+            pc.outfile='{}/lib{}.a'.format(outdir,pc.name)
+        else:
+            pc.outfile="{}/{}".format(outdir,pc.name)
+        return pc
+
+    def unitySources(self,pc,intr,exclude):
+        '''
+        Batch the sources of a project into unity build sources, written
+        in the intermediate directory.  Returns the list of sources to
+        compile: the unity sources, followed by the excluded ones
+        '''
+        patterns=filter(bool,re.split(',| ',exclude))
+        batched=[]
+        excluded=[]
+        for src in sorted(pc.srcs):
+            if [p for p in patterns if fnmatch.fnmatch(src,p) or fnmatch.fnmatch(os.path.basename(src),p)]:
+                excluded.append(src)
+            else:
+                batched.append(src)
+        units=[]
+        for i in xrange(0,len(batched),pc.unity):
+            path=os.path.join(intr,'unity_{}.cpp'.format(len(units)))
+            writeUnit(path,[os.path.join(pc.absdir,src) for src in batched[i:i+pc.unity]])
+            units.append(path)
+        # Remove units left from a larger number of sources
+        for f in os.listdir(intr):
+            if f.startswith('unity_') and f.endswith('.cpp') and not os.path.join(intr,f) in units:
+                os.remove(os.path.join(intr,f))
+        return units+excluded
+
+    def generateConfig(self,dir,files,cfg,o,props):
+        '''
+        Generate rules for a configuration (Debug/Release)
+        '''
+        pc=self.configure(dir,files,cfg,props)
+        o.write('TYPE={}\n'.format(pc.type))
+        
+        #o = open(output,'w')
+        mkProps=Properties()
+        o.write('CPP_{}={}\n'.format(cfg,pc.cpp))
+        mkProps.assign('CPP_{}'.format(cfg),pc.cpp)
+        o.write('INC_{}={}\n'.format(cfg,pc.inc))
+        mkProps.assign('INC_{}'.format(cfg),pc.inc)
+
+        cflags='-c $(OPT_{}) $(INC_{}) '.format(cfg,cfg)+pc.cflags
+        if pc.depfiles:
+            cflags=cflags+' -MMD -MP'
+        lflags='$(OPT_{}) $(OBJS_{}) '.format(cfg,cfg)+pc.lflags
         o.write('CFLAGS_{}={}\n'.format(cfg,cflags))
         o.write('LFLAGS_{}={}\n'.format(cfg,lflags))
-        objs=srcs
-        for e in src_exts:
-            objs = arreplace(objs,e,'.o')
-        for i in xrange(0,len(objs)):
-            objs[i]=os.path.join(intr,objs[i])
+        if pc.gch:
+            o.write('PCH_{}={}\n'.format(cfg,pchFlags(pc.gch)))
+        if pc.unity:
+            o.write('UNITY_{}={}\n'.format(cfg,pc.unity))
+        objs=pc.objs
             
         o.write("OBJS_{}=".format(cfg))
         for obj in objs:
@@ -290,59 +729,114 @@ class Generator:
         
         liblist=[]
 
-        for lib in libdeps:
+        for lib in pc.libdeps:
             libname="{}_{}".format(lib,cfg)
             liblist.append(libname)
-            libpath=libdeps.get(lib)
+            libpath=pc.libdeps.get(lib)
             o.write("{}:\n".format(libname))
-            o.write("\t@make --no-print-directory -C {} {}\n\n".format(libpath,cfg))
+            o.write("\t@$(MAKE) --no-print-directory -C {} {}\n\n".format(libpath,cfg))
             o.write("clean_{}:\n".format(libname))
-            o.write("\t@make --no-print-directory -C {} clean_{}\n\n".format(libpath,cfg))
+            o.write("\t@$(MAKE) --no-print-directory -C {} clean_{}\n\n".format(libpath,cfg))
         
         cleanlibs=''
-        if type=='LIB':
-            outfile='{}/lib{}.a'.format(reloutdir,name)
+        outfile=pc.outfile
+        if pc.type=='LIB':
             o.write('{}: $(OBJS_{})\n'.format(outfile,cfg))
-            o.write('\tar cr {} $(OBJS_{})\n\n'.format(outfile,cfg))
+            o.write('\t{} cr {} $(OBJS_{})\n\n'.format(pc.ar,outfile,cfg))
         else:
-            outfile="{}/{}".format(reloutdir,name)
             o.write('OUTPUT_PATH_{}={}\n\n'.format(cfg,outfile))
             if len(liblist)>0:
                 cleanlibs='clean_'+' clean_'.join(liblist)
-            liblist=' '.join(liblist)
+            if len(liblist)>0:
+                # The build scheduler builds the libraries first, and sets
+                # SCHEDULED so that only the library files are prerequisites
+                o.write('LIBDEPS_{}={}\n'.format(cfg,' '.join(liblist)))
+                o.write('ifdef SCHEDULED\nLIBDEPS_{}={}\nendif\n\n'.format(cfg,' '.join(pc.libfiles)))
+                liblist='$(LIBDEPS_{})'.format(cfg)
+            else:
+                liblist=''
             o.write('{}: $(OBJS_{}) {}\n'.format(outfile,cfg,liblist))
             o.write('\t$(CPP_{}) -o {} $(LFLAGS_{})\n\n'.format(cfg,outfile,cfg))
             
+        if pc.depfiles:
+            outfile='$(OBJS_{}:.o=.d) {}'.format(cfg,outfile)
+        if '-gsplit-dwarf' in pc.cflags:
+            outfile='$(OBJS_{}:.o=.dwo) {}'.format(cfg,outfile)
+        if pc.gch:
+            outfile='{} {}'.format(outfile,pc.gch)
+            if pc.depfiles:
+                outfile='{} {}'.format(outfile,pchDepfile(pc.gch))
         o.write('clean_{}: {}\n\t@rm -f $(OBJS_{}) {}\n\n'.format(cfg,cleanlibs,cfg,outfile))        
-        o.write('{}: {}\n\n'.format(cfg,outfile))
+        o.write('{}: {}\n\n'.format(cfg,pc.outfile))
+        if self.cppcheck:
+            self.writeAnalyzeTarget(pc,o)
             
+        if pc.depfiles:
+            # Header dependencies are written by the compiler (-MMD)
+            # and included below, so no scan is needed
+            alldeps=[': {}\n'.format(os.path.join(pc.absdir,src)) for src in pc.srcs]
+            pc.pchdeps=': {}\n'.format(pc.pch)
+        else:
+            # The dependency commands only contain preprocessor flags, so Release
+            # and Debug produce the same commands, and each source is scanned once
+            # unless the include paths or defines of the configurations differ
+            ppflags=preprocessorFlags(templates.generateMkCommand(cflags,mkProps))
+            depcmds=[]
+            for src in pc.srcs:
+                depcmds.append('g++ {} -MM {}'.format(ppflags,os.path.join(pc.absdir,src)))
+            if pc.pch:
+                depcmds.append('g++ {} -x c++-header -MM {}'.format(ppflags,pc.pch))
+            alldeps=self.dependencies(dir,depcmds)
+            if pc.pch:
+                pc.pchdeps=alldeps.pop()
         for i in xrange(0,len(objs)):
-            src=os.path.join(absdir,srcs[i])
-            depcmd='g++ {} -MM {}'.format(cflags,src)
-            depcmd=templates.generateMkCommand(depcmd,mkProps)
-            (out,err)=utils.shellcall(dir,depcmd)
-            p=out.find(':')
-            hdeps=':\n'
-            if p>0:
-                hdeps=out[p:].replace('\\\n','')
-            o.write('{}{}'.format(objs[i],hdeps))
-            if self.cppcheck:
-                o.write('\tcppcheck {}/{}\n'.format(absdir,srcs[i]))
-            o.write('\t$(CPP_{}) $(CFLAGS_{}) -o {} {}/{}\n\n'.format(cfg,cfg,objs[i],absdir,srcs[i]))
-            
-        return True
+            src=os.path.join(pc.absdir,pc.srcs[i])
+            o.write(objectRule(cfg,objs[i],alldeps[i],src,pc.gch))
+            if pc.depfiles:
+                self.context.graph.setDepfile(objs[i])
+            else:
+                self.context.graph.setObject(objs[i],alldeps[i][1:].split())
+        if pc.gch:
+            o.write(pchRule(cfg,pc.gch,pc.pchdeps,pc.pch))
+        if pc.depfiles:
+            o.write('-include $(OBJS_{}:.o=.d)\n\n'.format(cfg))
+            if pc.gch:
+                o.write('-include {}\n\n'.format(pchDepfile(pc.gch)))
+        pc.deps=alldeps
+        return pc
         
+    def writeAnalyzeTarget(self,pc,o):
+        '''
+        Write the analyze_<cfg> target, which runs cppcheck on the
+        project directory.  Results are kept in a cppcheck build directory,
+        so only changed files are analyzed again
+        '''
+        builddir=os.path.join(pc.intr,'cppcheck')
+        verifyDir(builddir)
+        o.write('analyze_{}:\n'.format(pc.cfg))
+        o.write('\tcppcheck -j {} -q --template=gcc --enable=warning,performance '.format(cpu_count()))
+        o.write('--cppcheck-build-dir={} $(INC_{}) {}\n\n'.format(builddir,pc.cfg,pc.absdir))
+
     def assignDefaults(self,props):
         props.assign("COMPILE_CPP_STD","-std=c++11")
         props.assign("COMPILE_CUSTOM","")
         props.assign("OPT_Release","-O2")
-            
-    def generate(self,dir,files):
-        #props=mkProps(Properties(),root)
-        for d,subs,subfiles in os.walk(dir):
+
+    def projectFiles(self,dir,files):
+        '''
+        Add the files in sub-directories of a project to its files list
+        '''
+        for d,subs,subfiles in self.context.walk(dir):
             if d!=dir:
                 for f in subfiles:
                     files.append(os.path.join(os.path.relpath(d,dir),f))
+        return files
+
+    def projectProps(self,dir):
+        '''
+        Returns the settings of a project, inherited from the
+        mk.cfg files of all directories up to the workspace root
+        '''
         stack=[]
         curdir=dir
         while True:
@@ -355,33 +849,120 @@ class Generator:
         while len(stack)>0:
             props=mkProps(props,stack[-1])
             del stack[-1]
-        output=os.path.join(dir,"Makefile")
-        o=open(output,"w")
+        return props
+
+    def optimizationFlags(self,props):
+        '''
+        Returns the optimization flags of each configuration
+        '''
         opt=props.get("OPT_Release")
         if len(opt)==0:
             opt="-O2"
         if opt=="Custom":
             opt=""
+        return {'Release':opt,'Debug':'-g'}
+            
+    def generate(self,dir,files):
+        #props=mkProps(Properties(),root)
+        files=self.projectFiles(dir,files)
+        props=self.projectProps(dir)
+        cachePath=os.path.join(dir.replace(self.srcDir,self.intrDir),'deps.cache')
+        self.depCache=DependencyCache(cachePath,self.mtimes)
+        output=os.path.join(dir,"Makefile")
+        o=open(output,"w")
+        opts=self.optimizationFlags(props)
         o.write('INC_STD=-I{}\n'.format(' -I'.join(stdIncludes)))
-        o.write('OPT_Release={} $(USER_OPT)\n'.format(opt))
-        o.write('OPT_Debug=-g $(USER_OPT)\n')
+        o.write('OPT_Release={} $(USER_OPT)\n'.format(opts.get('Release')))
+        o.write('OPT_Debug={} $(USER_OPT)\n'.format(opts.get('Debug')))
         o.write('\ndefault: Release\n\n')
         o.write('\nclean: clean_Release\n\n')
-        self.generateConfig(dir,files,"Release",o,props)
-        if self.generateConfig(dir,files,"Debug",o,props):
-            pass
+        configs=[]
+        for cfg in ['Release','Debug']:
+            pc=self.generateConfig(dir,files,cfg,o,props)
+            pc.opt=opts.get(cfg)
+            configs.append(pc)
+        objs=set()
+        for pc in configs:
+            objs.update(pc.objs)
+        self.context.graph.retainDirectory(dir.replace(self.srcDir,self.intrDir),objs)
         o.write('\nclang_complete:\n')
         o.write('\tclang -cc1 -std=c++11 -x c++ $(INC_STD) $(INC_Release) -w -fsyntax-only ')
         o.write('-code-completion-macros -v -code-completion-at -:$(LINE):$(COL) -\n\n')        
 
         o.close()
+        if not configs[0].depfiles:
+            self.depCache.save()
+        if buildSystem(self.root)=='Single Makefile':
+            import flatmake
+            flatmake.writeFragment(self.fragmentPath(dir),configs)
+
+    def fragmentPath(self,dir):
+        '''
+        Returns the path of the project fragment included
+        by the single workspace Makefile
+        '''
+        return os.path.join(dir.replace(self.srcDir,self.intrDir),'project.mk')
+
+    def projects(self):
+        '''
+        Returns the directories and files lists of all the workspace projects
+        '''
+        res=[]
+        for (dir,subdirs,files) in self.context.walk(self.srcDir):
+            if isSourceDir(dir,files):
+                res.append((dir,files))
+                subdirs[:]=[]  # do not recurse down project subdirs
+        return res
+
+    def generateNinja(self):
+        '''
+        Write a single build.ninja for the whole workspace
+        '''
+        import ninjagen
+        configs=[]
+        opts={}
+        for (dir,files) in self.projects():
+            files=self.projectFiles(dir,files)
+            props=self.projectProps(dir)
+            for cfg in ['Release','Debug']:
+                pc=self.configure(dir,files,cfg,props)
+                pc.opt=self.optimizationFlags(props).get(cfg)
+                configs.append(pc)
+        ninjagen.writeNinja(os.path.join(self.root,'build.ninja'),configs)
+
+    def generateSingleMakefile(self):
+        '''
+        Write a non-recursive workspace Makefile that includes the
+        fragments of all projects.  Missing fragments are generated
+        '''
+        import flatmake
+        fragments=[]
+        targets=[]
+        for (dir,files) in self.projects():
+            path=self.fragmentPath(dir)
+            if not os.path.exists(path):
+                self.generate(dir,list(files))
+            fragments.append(path)
+            rel=os.path.relpath(dir,self.srcDir)
+            targets.append(rel)
+        flatmake.writeWorkspaceMakefile(os.path.join(self.root,'Makefile'),fragments,targets)
+
+    def generateWorkspace(self):
+        '''
+        Generate the workspace level build files of the selected build system
+        '''
+        system=buildSystem(self.root)
+        if system=='Ninja':
+            self.generateNinja()
+        if system=='Single Makefile':
+            self.generateSingleMakefile()
         
 def generateTreeRun(root):
     g=Generator(root)
-    for (dir,subdirs,files) in os.walk(os.path.join(root,"src")):
-        if isSourceDir(dir,files):
-            g.generate(dir,files)
-            subdirs[:]=[]  # do not recurse down project subdirs
+    for (dir,files) in g.projects():
+        g.generate(dir,files)
+    g.generateWorkspace()
+    g.context.updateIncludeGraph()
 
 def generateTree(root,blocking):
     global genThread
@@ -397,9 +978,108 @@ def generateDirectory(root,dir):
     if genThread:
         waitForThread()
     g=Generator(root)
-    files=os.listdir(dir)
+    files=list(g.context.listDir(dir)[1])
     if isSourceDir(dir,files):
         g.generate(dir,files)
+    g.generateWorkspace()
+    g.context.updateIncludeGraph()
+
+def findProjectDir(root,path):
+    '''
+    Returns the project directory, containing the Makefile, of a source file
+    '''
+    src=os.path.join(root,'src')
+    dir=os.path.dirname(path)
+    while dir.startswith(src) and dir!=src:
+        if os.path.exists(os.path.join(dir,'Makefile')):
+            return dir
+        dir=os.path.dirname(dir)
+    return ''
+
+def makeVariable(text,name):
+    '''
+    Returns the value assigned to a variable in a generated Makefile
+    '''
+    prefix='\n{}='.format(name)
+    p=text.find(prefix)
+    if p<0:
+        return ''
+    p=p+len(prefix)
+    return text[p:text.find('\n',p)]
+
+def patchSource(root,path):
+    '''
+    Update the rules of a single source file in the existing Makefile
+    of its project, without scanning the rest of the workspace.
+    If the file no longer exists, its rules are removed.
+    Returns False if the Makefile has to be fully generated instead
+    '''
+    if genThread:
+        waitForThread()
+    dir=findProjectDir(root,path)
+    if not dir or buildSystem(root)!='Make':
+        return False
+    mkPath=os.path.join(dir,'Makefile')
+    text=open(mkPath,'r').read()
+    if makeVariable(text,'UNITY_Release'):
+        return False
+    absdir=os.path.abspath(dir)
+    rel=os.path.relpath(path,absdir)
+    exists=os.path.exists(path)
+    if exists and makeVariable(text,'TYPE')=='LIB':
+        pb=Properties(os.path.join(dir,'mk.cfg'))
+        if not pb.has('TYPE') and hasMain(path):
+            return False
+    intrDir=dir.replace(os.path.join(root,'src'),os.path.join(root,'.intr'))
+    cache=DependencyCache(os.path.join(intrDir,'deps.cache'))
+    graph=getContext(root).includeGraph()
+    for cfg in ['Release','Debug']:
+        depfiles='-MMD' in makeVariable(text,'CFLAGS_{}'.format(cfg))
+        gch=makeVariable(text,'PCH_{}'.format(cfg))
+        if gch:
+            gch=gch.split()[1]+'.gch'
+        obj=os.path.join(intrDir,cfg,objectName(rel))
+        start=text.find('OBJS_{}='.format(cfg))
+        rulesStart=text.find('\n{}: '.format(cfg))
+        if start<0 or rulesStart<0:
+            return False
+        end=text.find('\n\n',start)
+        objs=text[start:end].split('\\\n')[1:]
+        if exists and not obj in objs:
+            objs.append(obj)
+        if not exists and obj in objs:
+            objs.remove(obj)
+            graph.removeObject(obj)
+        text=text[0:start]+'OBJS_{}='.format(cfg)+''.join(['\\\n'+o for o in objs])+text[end:]
+        p=text.find('\n{}:'.format(obj))
+        if p>=0:
+            p=p+1
+            text=text[0:p]+text[(text.find('\n\n',p)+2):]
+        if exists and depfiles:
+            verifyDir(os.path.dirname(obj))
+            src='{}/{}'.format(absdir,rel)
+            p=text.find('\n\n',text.find('\n{}: '.format(cfg)))+2
+            text=text[0:p]+objectRule(cfg,obj,': {}\n'.format(src),src,gch)+text[p:]
+            graph.setDepfile(obj)
+        elif exists:
+            verifyDir(os.path.dirname(obj))
+            mkProps=Properties()
+            mkProps.assign('INC_{}'.format(cfg),makeVariable(text,'INC_{}'.format(cfg)))
+            cflags=templates.generateMkCommand(makeVariable(text,'CFLAGS_{}'.format(cfg)),mkProps)
+            depcmd='g++ {} -MM {}'.format(preprocessorFlags(cflags),os.path.join(absdir,rel))
+            if not cache.valid(dir,depcmd):
+                cache.update(dir,depcmd,scanDependencies(dir,depcmd))
+            deps=cache.get(depcmd) if cache.valid(dir,depcmd) else ':\n'
+            p=text.find('\n\n',text.find('\n{}: '.format(cfg)))+2
+            src='{}/{}'.format(absdir,rel)
+            text=text[0:p]+objectRule(cfg,obj,deps,src,gch)+text[p:]
+            graph.setObject(obj,deps[1:].split())
+    cache.save(False)
+    getContext(root).saveGraph()
+    o=open(mkPath,'w')
+    o.write(text)
+    o.close()
+    return True
 
 def unit_test():
     generateTree("src")
@@ -0,0 +1,223 @@
+import os
+import json
+import threading
+from globals import is_src_ext
+
+def parseRule(text):
+    '''
+    Returns the (target,prerequisites) of the first rule in a make text
+    '''
+    text=text.replace('\\\n',' ')
+    p=text.find(':')
+    if p<0:
+        return ('',[])
+    return (text[0:p].strip(),text[p+1:].split('\n')[0].split())
+
+def indexPath(root):
+    '''
+    Returns the path of the saved include graph of a workspace
+    '''
+    return os.path.join(root,'.intr','includes.json')
+
+def synchronized(f):
+    '''
+    Run a method holding the lock of its object
+    '''
+    def locked(self,*args):
+        with self.lock:
+            return f(self,*args)
+    return locked
+
+class IncludeGraph:
+    '''
+    Header dependencies of all the workspace objects, and the reverse
+    map of the objects that depend on each header.  Dependencies are
+    either set from the generator scans, or read from the dependency
+    files of the compiler, which are parsed again when they change.
+
+    The graph is changed by the generator thread and read by the UI,
+    so its methods hold its lock
+    '''
+    def __init__(self):
+        self.lock=threading.RLock()
+        self.objects={}
+        self.headers={}
+        self.depfiles={}
+        self.loaded=False
+        self.modified=False
+
+    @synchronized
+    def setObject(self,obj,deps):
+        '''
+        Set the dependencies of an object.  Only headers are kept
+        '''
+        self.removeObject(obj)
+        headers=set([os.path.normpath(d) for d in deps if not is_src_ext(d) and not d.endswith('.gch')])
+        self.objects[obj]=headers
+        self.modified=True
+        for h in headers:
+            if not h in self.headers:
+                self.headers[h]=set()
+            self.headers.get(h).add(obj)
+
+    @synchronized
+    def setDepfile(self,obj):
+        '''
+        Take the dependencies of an object from its compiler dependency file.
+        Headers already read from the file are kept until it changes
+        '''
+        if obj in self.depfiles:
+            return
+        self.removeObject(obj)
+        self.depfiles[obj]=None
+        self.modified=True
+
+    @synchronized
+    def removeObject(self,obj):
+        for h in self.objects.get(obj,[]):
+            objs=self.headers.get(h)
+            objs.discard(obj)
+            if len(objs)==0:
+                del self.headers[h]
+        if obj in self.objects:
+            del self.objects[obj]
+        if obj in self.depfiles:
+            del self.depfiles[obj]
+        self.modified=True
+
+    @synchronized
+    def retainDirectory(self,dir,objs):
+        '''
+        Remove the objects built in a directory that are not in objs
+        '''
+        prefix=dir.rstrip('/')+'/'
+        for obj in self.objects.keys()+self.depfiles.keys():
+            if obj.startswith(prefix) and not obj in objs:
+                self.removeObject(obj)
+
+    @synchronized
+    def refresh(self):
+        '''
+        Read the dependency files that changed since they were last read
+        '''
+        for obj in self.depfiles.keys():
+            path=os.path.splitext(obj)[0]+'.d'
+            try:
+                t=os.path.getmtime(path)
+            except OSError:
+                continue
+            if self.depfiles.get(obj)!=t:
+                (target,deps)=parseRule(open(path,'r').read())
+                self.setObject(obj,deps)
+                self.depfiles[obj]=t
+
+    @synchronized
+    def loadMakefile(self,path):
+        '''
+        Add the objects of a generated project Makefile
+        '''
+        from genmake import makeVariable
+        text=open(path,'r').read()
+        for cfg in ['Release','Debug']:
+            depfiles='-MMD' in makeVariable(text,'CFLAGS_{}'.format(cfg))
+            start=text.find('OBJS_{}='.format(cfg))
+            if start<0:
+                continue
+            for obj in text[start:text.find('\n\n',start)].split('\\\n')[1:]:
+                if depfiles:
+                    self.setDepfile(obj)
+                else:
+                    p=text.find('\n{}:'.format(obj))
+                    if p>=0:
+                        self.setObject(obj,parseRule(text[p+1:])[1])
+
+    @synchronized
+    def load(self,path):
+        '''
+        Load an index written by save.  Returns False if it cannot be read
+        '''
+        try:
+            index=json.load(open(path,'r'))
+        except (IOError,ValueError):
+            return False
+        for (obj,headers) in index.get('objects').items():
+            self.setObject(obj,headers)
+        for (obj,t) in index.get('depfiles').items():
+            self.depfiles[obj]=t
+        self.modified=False
+        return True
+
+    @synchronized
+    def save(self,path):
+        '''
+        Write the graph as an index, if it changed since it was loaded
+        '''
+        if not self.modified:
+            return
+        objects={}
+        for obj in self.objects:
+            objects[obj]=sorted(self.objects.get(obj))
+        try:
+            json.dump({'objects':objects,'depfiles':self.depfiles},open(path,'w'))
+            self.modified=False
+        except IOError:
+            pass
+
+    @synchronized
+    def loadWorkspace(self,root):
+        '''
+        Load the objects of all the workspace projects, from the saved
+        index or, if there is none, from the generated Makefiles
+        '''
+        if not self.load(indexPath(root)):
+            for dir,subdirs,files in os.walk(os.path.join(root,'src')):
+                if 'Makefile' in files:
+                    self.loadMakefile(os.path.join(dir,'Makefile'))
+        self.loaded=True
+
+    @synchronized
+    def objectsFor(self,header):
+        '''
+        Returns the objects that are rebuilt when a header changes
+        '''
+        return sorted(self.headers.get(os.path.normpath(header),[]))
+
+    @synchronized
+    def fanIn(self,cfg):
+        '''
+        Returns the (header,count) pairs of the number of objects of
+        a configuration including each header, directly or indirectly
+        '''
+        res=[]
+        for h in self.headers:
+            n=len([obj for obj in self.headers.get(h) if '/{}/'.format(cfg) in obj])
+            if n>0:
+                res.append((h,n))
+        return sorted(res,key=lambda x: x[1],reverse=True)
+
+    @synchronized
+    def recompileCost(self,cfg,times):
+        '''
+        Returns the (header,seconds) pairs of the compile time of the objects
+        that are rebuilt when each header changes.  Objects that have no time
+        in the `times` map count as one second
+        '''
+        res=[]
+        for (h,n) in self.fanIn(cfg):
+            cost=sum([times.get(obj,1.0) for obj in self.headers.get(h) if '/{}/'.format(cfg) in obj])
+            res.append((h,cost))
+        return sorted(res,key=lambda x: x[1],reverse=True)
+
+def report(graph,root,cfg,times,top=15):
+    '''
+    Returns the lines of the include graph report of a configuration
+    '''
+    def name(h):
+        return os.path.relpath(h,root) if h.startswith(root) else h
+    lines=['Headers with the largest fan-in ({})'.format(cfg)]
+    for (h,n) in graph.fanIn(cfg)[0:top]:
+        lines.append('  {:8d}   {}'.format(n,name(h)))
+    lines.append('Headers with the largest recompilation cost ({})'.format(cfg))
+    for (h,cost) in graph.recompileCost(cfg,times)[0:top]:
+        lines.append('  {:8.2f}s  {}'.format(cost,name(h)))
+    return lines
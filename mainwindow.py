@@ -17,6 +17,9 @@ from functools import partial
 from globals import is_src_ext
 import utils
 import genmake
+import compilercache
+import buildreport
+import buildjobs
 import uis
 import plugins
 import dwarf
@@ -53,6 +56,7 @@ class MainWindow(QtGui.QMainWindow):
         self.setWindowTitle("Coide")
 
         self.generateQueue=set()        
+        self.patchQueue=set()
         self.editors={}
         self.file_times={}
         self.central=QtGui.QTabWidget()
@@ -73,6 +77,11 @@ class MainWindow(QtGui.QMainWindow):
         self.showLocalsPane()
         self.showCallStackPane()
         self.buildProcess=None        
+        self.launcher=''
+        self.cacheStats=None
+        self.reportBuild=False
+        self.analyzer=None
+        self.cppcheck=None
         self.timerCall=None
         
 
@@ -211,6 +220,7 @@ class MainWindow(QtGui.QMainWindow):
         m.addAction(QtGui.QAction('&Rebuild',self,shortcut='Shift+F7',triggered=self.rebuild))
         m.addAction(QtGui.QAction('&Settings',self,shortcut='Ctrl+F7',triggered=self.buildSettings))
         m.addAction(QtGui.QAction('&Next Error',self,shortcut='F4',triggered=self.nextError))
+        m.addAction(QtGui.QAction('&Include Report',self,triggered=self.includeReport))
         
         m=bar.addMenu('&Debug')
         m.addAction(QtGui.QAction('&Run',self,shortcut='Ctrl+F5',triggered=self.runProject))
@@ -298,9 +308,13 @@ class MainWindow(QtGui.QMainWindow):
             (dir,name)=os.path.split(objpath)
             objpath=os.path.join(dir,'Debug',name)
         if srcpath.startswith(self.workspaceTree.root) and srcpath.endswith('.h'):
-            dir=self.workspaceTree.mainPath()
-            mkPath=os.path.join(dir,'Makefile')
-            objpath=utils.objForHeader(mkPath,srcpath)
+            objs=utils.objsForHeader(self.workspaceTree.root,srcpath)
+            objs=[o for o in objs if '/Debug/' in o]
+            built=[o for o in objs if os.path.exists(o)]
+            if len(built)>0:
+                objpath=built[0]
+            elif len(objs)>0:
+                objpath=objs[0]
         if len(objpath)>0:
             try:
                 s=dwarf.DwarfSymbols(objpath)
@@ -455,7 +469,7 @@ class MainWindow(QtGui.QMainWindow):
     def settingsGeneral(self):
         """ Show the general settings """
         from settings import GeneralSettingsDialog
-        d=GeneralSettingsDialog()
+        d=GeneralSettingsDialog(self.workspaceTree.settings())
         if d.exec_():
             d.save()
             self.updateGeneralSettings()
@@ -502,6 +516,7 @@ class MainWindow(QtGui.QMainWindow):
         s=QtCore.QSettings()
         sortFiles=s.value('sortFiles',True).toBool()
         self.workspaceTree.setSorting(sortFiles)
+        self.outputEdit.setLineLimit((s.value('output_lines',100000).toInt())[0])
         
     def updateEditorsSettings(self):
         """ Apply editor settings to all open tabs """
@@ -600,6 +615,20 @@ class MainWindow(QtGui.QMainWindow):
                 self.workspaceTree.addLibrariesToProject(self.added)
         
         
+    def includeReport(self):
+        '''
+        Show the headers with the largest fan-in and recompilation cost
+        '''
+        import includegraph
+        root=self.workspaceTree.root
+        graph=genmake.getContext(root).includeGraph()
+        times={}
+        for (t,obj) in buildreport.readTimes(root).get('compile'):
+            times[obj]=t
+        self.outputEdit.clearAll()
+        for line in includegraph.report(graph,root,self.config,times):
+            utils.appendColorLine(self.outputEdit,line,'#000080')
+
     def buildSettings(self,path=''):
         from buildsettings import BuildSettingsDialog
         if not path:
@@ -622,31 +651,120 @@ class MainWindow(QtGui.QMainWindow):
                 utils.appendColorLine(self.outputEdit,"Success...",'#008020')
             else:
                 utils.appendColorLine(self.outputEdit,"= Failed ({}) =".format(rcs[0]),'#ff0000')
+            self.showCacheStats()
+            genmake.getContext(self.workspaceTree.root).updateIncludeGraph()
+            self.showBuildReport()
+            self.rescanWorkspaceSymbols()
             self.checkBuildOutput()
             self.asyncPollTimer.stop()
             self.showStatus("Done")
             
+    def rescanWorkspaceSymbols(self):
+        '''
+        Read the symbols of the workspace libraries that were built
+        '''
+        if self.symbolScan:
+            import system
+            if system.isScannerDone():
+                system.getLibrarySymbols()
+                import symbolscanner
+                symbolscanner.rescanWorkspace()
+
+    def readCacheStats(self):
+        '''
+        Keep the compiler launcher counters from before a build
+        '''
+        self.launcher=genmake.compilerLauncher(self.workspaceTree.root)
+        self.cacheStats=None
+        if self.launcher:
+            self.cacheStats=compilercache.readStats(self.launcher)
+
+    def showCacheStats(self):
+        '''
+        Show the compiler launcher hit rate of the last build
+        '''
+        if self.cacheStats:
+            line=compilercache.report(self.launcher,self.cacheStats)
+            if line:
+                utils.appendColorLine(self.outputEdit,line,'#000080')
+            self.cacheStats=None
+
+    def startBuildReport(self):
+        '''
+        Clear the build steps timing log, if the build report is enabled
+        '''
+        root=self.workspaceTree.root
+        self.reportBuild=genmake.buildReport(root)
+        if self.reportBuild:
+            buildreport.startBuild(root)
+
+    def showBuildReport(self):
+        '''
+        Show the slowest build steps and most included headers
+        '''
+        if self.reportBuild:
+            for line in buildreport.report(self.workspaceTree.root,self.config):
+                utils.appendColorLine(self.outputEdit,line,'#000080')
+            self.reportBuild=False
+
     def execute(self,path,cmd,*args):
+        return self.startAsync(lambda: utils.execute(self.outputEdit,path,cmd,*args))
+
+    def startAsync(self,start):
         if utils.pendingAsync():
             self.showStatus('Busy')
             return None
         self.outputEdit.clearAll()
-        p=utils.execute(self.outputEdit,path,cmd,*args)
+        p=start()
         if not self.asyncPollTimer.isActive():
             self.asyncPollTimer.start(10)
         return p
+
+    def scheduleBuild(self,path,clean=False):
+        '''
+        Build a project and its workspace libraries, running
+        independent projects concurrently
+        '''
+        from scheduler import BuildScheduler
+        (slots,load)=buildjobs.buildLimits(self.workspaceTree.settings())
+        root=self.workspaceTree.root
+        return self.startAsync(lambda: utils.addAsync(BuildScheduler(self.outputEdit,root,path,self.config,slots,load,clean,self.showStatus)))
         
     def buildSpecific(self,path):
         self.saveAll()
-        self.autoGenerate()
+        if len(self.generateQueue)>0 or len(self.patchQueue)>0:
+            self.autoGenerateRun()
         if len(path)>0:
             self.showStatus("Building "+os.path.basename(path))
-            s=QtCore.QSettings()
-            if s.value('parallel_make',False).toBool():
-                self.buildProcess=self.execute(path,'/usr/bin/make','-j',self.config)
+            self.readCacheStats()
+            self.startBuildReport()
+            root=self.workspaceTree.root
+            system=genmake.buildSystem(root)
+            target=genmake.projectTarget(root,path,self.config)
+            args=buildjobs.jobArgs(*buildjobs.buildLimits(self.workspaceTree.settings()))
+            if system=='Ninja':
+                if not self.checkNinja(root):
+                    return
+                self.buildProcess=self.execute(root,'ninja',*(args+[target]))
+            elif system=='Single Makefile':
+                self.buildProcess=self.execute(root,'/usr/bin/make',*(args+[target]))
+            elif os.path.exists(os.path.join(path,'Makefile')):
+                self.buildProcess=self.scheduleBuild(path)
             else:
-                self.buildProcess=self.execute(path,'/usr/bin/make',self.config)
+                self.buildProcess=self.execute(path,'/usr/bin/make',*(args+[self.config]))
                 
+    def checkNinja(self,root):
+        '''
+        Check that ninja is installed, for workspaces built with it.
+        Reports the error in the output pane if it is missing
+        '''
+        if genmake.getContext(root).tool('ninja'):
+            return True
+        self.outputEdit.clear()
+        utils.appendColorLine(self.outputEdit,'ninja is not installed, install it or select another build system in the workspace settings','#ff0000')
+        self.showStatus('Ready')
+        return False
+
     def processBuildOutput(self,output):
         undefs=self.findUndefinedReferences(output)
         if len(undefs)>0:
@@ -657,7 +775,16 @@ class MainWindow(QtGui.QMainWindow):
             
     def cleanSpecific(self,path):
         if len(path)>0:
-            self.execute(path,'/usr/bin/make','clean_{}'.format(self.config))
+            root=self.workspaceTree.root
+            system=genmake.buildSystem(root)
+            target=genmake.projectTarget(root,path,self.config)
+            if system=='Ninja':
+                if self.checkNinja(root):
+                    self.execute(root,'ninja','-t','clean',target)
+            elif system=='Single Makefile':
+                self.execute(root,'/usr/bin/make','clean_'+target)
+            else:
+                self.execute(path,'/usr/bin/make','clean_{}'.format(self.config))
         
     def clean(self):
         self.cleanSpecific(self.workspaceTree.mainPath())
@@ -666,25 +793,97 @@ class MainWindow(QtGui.QMainWindow):
         if len(path)>0:
             cfg=self.config
             self.showStatus("Rebuilding "+os.path.basename(path))
-            self.buildProcess=self.execute(path,'/usr/bin/make','clean_'+cfg,cfg)
+            self.readCacheStats()
+            self.startBuildReport()
+            root=self.workspaceTree.root
+            system=genmake.buildSystem(root)
+            target=genmake.projectTarget(root,path,cfg)
+            args=' '.join(buildjobs.jobArgs(*buildjobs.buildLimits(self.workspaceTree.settings())))
+            if system=='Ninja':
+                if not self.checkNinja(root):
+                    return
+                cmd='ninja -t clean {0} && ninja {1} {0}'.format(target,args)
+                self.buildProcess=self.execute(root,'/bin/sh','-c',cmd)
+            elif system=='Single Makefile':
+                # Clean first, so the parallel jobs do not race the clean
+                cmd='/usr/bin/make clean_{0} && /usr/bin/make {1} {0}'.format(target,args)
+                self.buildProcess=self.execute(root,'/bin/sh','-c',cmd)
+            elif os.path.exists(os.path.join(path,'Makefile')):
+                self.buildProcess=self.scheduleBuild(path,True)
+            else:
+                cmd='/usr/bin/make clean_{0} && /usr/bin/make {1} {0}'.format(cfg,args)
+                self.buildProcess=self.execute(path,'/bin/sh','-c',cmd)
     
     def rebuild(self):
         self.rebuildSpecific(self.workspaceTree.mainPath())
         
+    def patchSources(self):
+        """
+        Update the Makefile rules of individually added, saved or
+        removed source files.  Projects that cannot be patched are
+        queued for a full generation
+        """
+        root=self.workspaceTree.root
+        for path in self.patchQueue:
+            dir=genmake.findProjectDir(root,path)
+            if dir and not dir in self.generateQueue:
+                if not genmake.patchSource(root,path):
+                    self.generateQueue.add(dir)
+        self.patchQueue.clear()
+
     def autoGenerateRun(self):
+        self.patchSources()
         for path in self.generateQueue:
             genmake.generateDirectory(self.workspaceTree.root,path)
         self.generateQueue.clear()
         self.showStatus('Ready')
         
     def autoGenerate(self):
-        if len(self.generateQueue)>0:
+        if len(self.generateQueue)>0 or len(self.patchQueue)>0:
             self.showStatus('Generating Makefiles')
             self.timerCall=self.autoGenerateRun
         else:
             if genmake.genThreadDone():
                 self.showStatus("Makefile Generate Done")
         
+    def analyzeFile(self,path):
+        '''
+        Queue a source file for background static analysis
+        '''
+        if self.cppcheck is None:
+            self.cppcheck=utils.checkFor('cppcheck')
+        if not self.cppcheck:
+            return
+        root=self.workspaceTree.root
+        if not self.analyzer or self.analyzer.root!=root:
+            import analyzer
+            self.analyzer=analyzer.Analyzer(root)
+        self.analyzer.analyze(path)
+
+    def showAnalysisResults(self):
+        '''
+        Show the findings of the background analysis in the open editors
+        '''
+        if not self.analyzer:
+            return
+        types={'error':qutepart.Qutepart.LINT_ERROR,'warning':qutepart.Qutepart.LINT_WARNING}
+        order=[qutepart.Qutepart.LINT_ERROR,qutepart.Qutepart.LINT_WARNING,qutepart.Qutepart.LINT_NOTE]
+        results=self.analyzer.takeResults()
+        for path in results:
+            e=self.editors.get(path)
+            if e and not e.document().isModified():
+                marks={}
+                for (line,severity,msg) in results.get(path):
+                    line=max(line-1,0)
+                    type=types.get(severity,qutepart.Qutepart.LINT_NOTE)
+                    if line in marks:
+                        (prev,text)=marks.get(line)
+                        if order.index(prev)<order.index(type):
+                            type=prev
+                        msg=text+'\n'+msg
+                    marks[line]=(type,msg)
+                e.lintMarks=marks
+
     def waitForScanner(self):
         if self.symbolScan:
             import system
@@ -705,14 +904,20 @@ class MainWindow(QtGui.QMainWindow):
             self.timerCall=None
             f()
         self.autoGenerate()
+        self.showAnalysisResults()
         #if self.statusBar().currentMessage() == MainWindow.LIBRARY_SCAN:
         if self.symbolScan:
             import system
+            scanning=self.statusBar().currentMessage().startswith(MainWindow.LIBRARY_SCAN)
             if system.isScannerDone():
                 #if system.scanq and not system.scanq.empty():
-                if self.statusBar().currentMessage() == MainWindow.LIBRARY_SCAN:
+                if scanning:
                     self.showStatus('Ready')
                 system.getLibrarySymbols()
+            elif scanning:
+                (done,total)=system.scannerProgress()
+                if total>0:
+                    self.showStatus('{} {}/{}'.format(MainWindow.LIBRARY_SCAN,done,total))
                 
     def timer5000(self):
         import scm
@@ -837,13 +1042,14 @@ class MainWindow(QtGui.QMainWindow):
                     f.close()
                     doc.setModified(False)
                     self.file_times[path]=os.path.getmtime(path)
-                    #dir=os.path.dirname(path)
-                    #self.generateQueue.add(dir)
-                    if self.symbolScan:
-                        from system import getLibrarySymbols
-                        getLibrarySymbols()
-                        from symbolscanner import rescanOnFileSave
-                        rescanOnFileSave(path)
+                    if is_src_ext(path):
+                        self.patchQueue.add(path)
+                        self.analyzeFile(path)
+                    elif path.startswith(self.workspaceTree.root):
+                        graph=genmake.getContext(self.workspaceTree.root).includeGraph()
+                        objs=[o for o in graph.objectsFor(path) if '/{}/'.format(self.config) in o]
+                        if len(objs)>0:
+                            self.showStatus('{} objects depend on {}'.format(len(objs),os.path.basename(path)))
 
 
     def saveFile(self):
@@ -1020,6 +1226,8 @@ class MainWindow(QtGui.QMainWindow):
                     bps=self.breakpoints.pathBreakpoints(path)
                     editor.bpMarks=bps
                     editor._markArea.blockDoubleClicked.connect(self.markToggleBreakpoint)
+                    if is_src_ext(path):
+                        self.analyzeFile(path)
                     return True
             except IOError:
                 return False
@@ -1096,6 +1304,7 @@ class MainWindow(QtGui.QMainWindow):
         self.paneOutput.setAllowedAreas(QtCore.Qt.BottomDockWidgetArea)
         self.outputEdit=output.OutputWidget(self.paneOutput,self)
         self.outputEdit.setReadOnly(True)
+        self.outputEdit.setLineLimit((QtCore.QSettings().value('output_lines',100000).toInt())[0])
         self.paneOutput.setWidget(self.outputEdit)
         self.addDockWidget(QtCore.Qt.BottomDockWidgetArea,self.paneOutput)
 
@@ -1166,12 +1375,7 @@ class MainWindow(QtGui.QMainWindow):
         is scrolled to show the end 
         
         """
-        text=self.outputEdit.toPlainText()
-        self.outputEdit.setPlainText(text+added)
-        c=self.outputEdit.textCursor()
-        c.movePosition(QtGui.QTextCursor.End)
-        self.outputEdit.setTextCursor(c)
-        self.outputEdit.ensureCursorVisible()
+        self.outputEdit.appendText(added)
         
     def tempScriptPath(self):
         """
@@ -1308,7 +1512,7 @@ class MainWindow(QtGui.QMainWindow):
         if self.debugger:
             self.actCont()
             return
-        self.outputEdit.setPlainText('')
+        self.outputEdit.clearAll()
         cmd=[self.workspaceTree.getExecutablePath()]
         args=self.workspaceTree.getDebugParams().split()
         cwd=self.workspaceTree.getDebugDirectory()
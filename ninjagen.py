@@ -0,0 +1,86 @@
+import os
+from genmake import pchFlags, pchDepfile
+
+header='''ninja_required_version = 1.3
+builddir = .intr
+ar = ar
+
+rule cxx
+  command = $cpp -MMD -MF $dep -c $cflags $pch -o $out $in
+  depfile = $dep
+  description = Compiling $in
+
+rule pch
+  command = $cpp -MMD -MF $dep -c $cflags -x c++-header -o $out $in
+  depfile = $dep
+  description = Precompiling $in
+
+rule ar
+  command = rm -f $out && $ar cr $out $in
+  description = Creating library $out
+
+rule link
+  command = $cpp -o $out $opt $in $lflags
+  description = Linking $out
+
+'''
+
+def escape(path):
+    '''
+    Escape a path to be used in a ninja build statement
+    '''
+    return path.replace('$','$$').replace(' ','$ ').replace(':','$:')
+
+def writeNinja(path,configs):
+    '''
+    Write a single ninja file that builds all the
+    project configurations in the list
+    '''
+    o=open(path,'w')
+    o.write(header)
+    targets={}
+    for pc in configs:
+        var=pc.key()
+        o.write('# {} ({})\n'.format(pc.rel,pc.cfg))
+        o.write('cflags_{}={} {} {}\n'.format(var,pc.opt,pc.inc,pc.cflags))
+        o.write('lflags_{}={}\n\n'.format(var,pc.lflags))
+        gch=''
+        if pc.gch:
+            gch=' | '+escape(pc.gch)
+            o.write('build {}: pch {}\n'.format(escape(pc.gch),escape(pc.pch)))
+            o.write('  dep = {}\n'.format(escape(pchDepfile(pc.gch))))
+            o.write('  cpp = {}\n'.format(pc.cpp))
+            o.write('  cflags = $cflags_{}\n'.format(var))
+        objs=[]
+        for (src,obj) in zip(pc.srcs,pc.objs):
+            # The dependency files are where the generated Makefiles
+            # put them, and are kept, so the include graph reads them
+            dep=escape(os.path.splitext(obj)[0]+'.d')
+            obj=escape(obj)
+            objs.append(obj)
+            o.write('build {}: cxx {}{}\n'.format(obj,escape(os.path.join(pc.absdir,src)),gch))
+            o.write('  dep = {}\n'.format(dep))
+            o.write('  cpp = {}\n'.format(pc.cpp))
+            o.write('  cflags = $cflags_{}\n'.format(var))
+            if pc.gch:
+                o.write('  pch = {}\n'.format(pchFlags(pc.gch)))
+        outfile=escape(pc.outfile)
+        if pc.type=='LIB':
+            o.write('build {}: ar {}\n'.format(outfile,' '.join(objs)))
+            o.write('  ar = {}\n\n'.format(pc.ar))
+        else:
+            libs=''
+            if len(pc.libfiles)>0:
+                libs=' | '+' '.join([escape(l) for l in pc.libfiles])
+            o.write('build {}: link {}{}\n'.format(outfile,' '.join(objs),libs))
+            o.write('  cpp = {}\n'.format(pc.cpp))
+            o.write('  opt = {}\n'.format(pc.opt))
+            o.write('  lflags = $lflags_{}\n\n'.format(var))
+        o.write('build {}: phony {}\n\n'.format(escape(pc.target()),outfile))
+        if not pc.cfg in targets:
+            targets[pc.cfg]=[]
+        targets.get(pc.cfg).append(outfile)
+    for cfg in sorted(targets.keys()):
+        o.write('build {}: phony {}\n'.format(cfg,' '.join(targets.get(cfg))))
+    o.write('\ndefault Release\n')
+    o.close()
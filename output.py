@@ -27,6 +27,7 @@ class OutputWidget(QtGui.QPlainTextEdit):
         self.cursorTimer=QtCore.QTimer(self)
         self.cursorTimer.timeout.connect(self.updateCursor)
         self.errors=[]
+        self.removedRows=0
         
     def mouseDoubleClickEvent(self,event):
         c=self.textCursor()
@@ -70,9 +71,50 @@ class OutputWidget(QtGui.QPlainTextEdit):
         self.setTextCursor(c)
         self.ensureCursorVisible()        
         
+    def setLineLimit(self,n):
+        """ Keep only the last n lines, or all the lines if n is 0 """
+        self.setMaximumBlockCount(n)
+        
+    def rows(self):
+        if self.document().isEmpty():
+            return 0
+        return self.blockCount()
+        
+    def countRemoved(self,expected):
+        """
+        Count the lines removed at the start by the line limit.
+        Error rows are kept from the first line ever appended,
+        and are moved by the removed lines when used
+        """
+        removed=expected-self.blockCount()
+        if removed>0:
+            self.removedRows=self.removedRows+removed
+        
     def appendLine(self,line):
-        outputRow=self.blockCount()
-        self.appendPlainText(line)
+        self.appendLines([line])
+
+    def appendLines(self,lines):
+        """ Append a batch of lines with a single insert """
+        before=self.rows()
+        outputRow=self.removedRows+before
+        self.appendPlainText('\n'.join(lines))
+        self.countRemoved(before+len(lines))
+        for line in lines:
+            self.parseError(line,outputRow)
+            outputRow=outputRow+1
+            
+    def appendText(self,text):
+        """ Append program output, which may end with a partial line """
+        expected=self.blockCount()+text.count('\n')
+        c=self.textCursor()
+        c.movePosition(QtGui.QTextCursor.End)
+        c.setCharFormat(QtGui.QTextCharFormat())
+        c.insertText(text)
+        self.setTextCursor(c)
+        self.ensureCursorVisible()
+        self.countRemoved(expected)
+
+    def parseError(self,line,outputRow):
         p=line.find(' ')
         if p>0:
             posStr=line[0:p]
@@ -91,16 +133,18 @@ class OutputWidget(QtGui.QPlainTextEdit):
                     self.errors.append((path,row,col,msg,outputRow))
                 
     def getNextError(self):
+        self.errors=[e for e in self.errors if e[4]>=self.removedRows]
         if len(self.errors)==0:
             return None
         e=self.errors[0]
         del self.errors[0]
         self.errors.append(e)
-        return e
+        return e[0:4]+(e[4]-self.removedRows,)
         
     def clearAll(self):
         self.clear()
         self.errors=[]
+        self.removedRows=0
         
     def setBlinkingCursor(self,state):
         if state!=self.blinking:
@@ -0,0 +1,142 @@
+import os
+from collections import deque
+from functools import partial
+import utils
+import genmake
+import buildjobs
+
+def projectGraph(root,dir):
+    '''
+    Returns the library dependencies of a project and, recursively,
+    of all the workspace libraries it links with, as {dir: [libdirs]}
+    '''
+    graph={}
+    stack=[dir]
+    while len(stack)>0:
+        d=stack.pop()
+        if not d in graph:
+            graph[d]=genmake.projectLibraries(root,d)
+            stack.extend(graph.get(d))
+    return graph
+
+def objectCount(dir,cfg):
+    '''
+    Returns the number of objects of a project configuration
+    '''
+    try:
+        text=open(os.path.join(dir,'Makefile'),'r').read()
+    except IOError:
+        return 0
+    start=text.find('OBJS_{}='.format(cfg))
+    if start<0:
+        return 0
+    return len(text[start:text.find('\n\n',start)].split('\\\n'))-1
+
+def isCompileLine(line):
+    '''
+    Check if a make output line compiles an object, excluding
+    the precompiled header, which is not counted in the objects
+    '''
+    return utils.stripLauncher(line).split(' ')[1:2]==['-c'] and not '-x c++-header' in line
+
+class BuildScheduler:
+    '''
+    Builds a project together with the workspace libraries it links with.
+    Each project is built by its own make, once the libraries it depends
+    on are built, so independent projects are built concurrently.
+    The jobs of the running makes never exceed the number of slots,
+    and no make starts jobs while the load average is above the load limit.
+
+    The scheduler is polled like a single AsyncExecute process
+    '''
+    def __init__(self,output,root,dir,cfg,slots,load=0,clean=False,status=None):
+        self.output=output
+        self.cfg=cfg
+        self.slots=max(1,slots)
+        self.load=load
+        self.status=status
+        self.graph=projectGraph(root,dir)
+        self.pending=set(self.graph.keys())
+        self.done=set()
+        self.running={}
+        self.totals={}
+        for d in self.graph:
+            self.totals[d]=objectCount(d,cfg)
+        self.cmdlist=['make',cfg,dir]
+        self.text=deque(maxlen=20000)
+        self.compiled={}
+        self.rc=None
+        self.failed=0
+        self.cleaner=None
+        if clean:
+            # Cleaning the project also cleans its libraries
+            self.cleaner=utils.AsyncExecute(output,dir,['/usr/bin/make','clean_'+cfg])
+
+    def dependents(self,dir):
+        return len([d for d in self.graph if dir in self.graph.get(d)])
+
+    def start(self):
+        '''
+        Start the projects whose libraries are built, sharing
+        the free slots between them
+        '''
+        free=self.slots-sum([jobs for (ae,jobs) in self.running.values()])
+        ready=[d for d in self.pending if not [lib for lib in self.graph.get(d) if not lib in self.done]]
+        # Libraries needed by more projects are started first
+        ready.sort(key=self.dependents,reverse=True)
+        while free>0 and len(ready)>0:
+            jobs=max(1,free/len(ready))
+            d=ready.pop(0)
+            self.pending.remove(d)
+            # The libraries are already built, so they are not made again recursively
+            args=['/usr/bin/make','--no-print-directory']+buildjobs.jobArgs(jobs,self.load)+['SCHEDULED=1',self.cfg]
+            self.compiled[d]=0
+            self.running[d]=(utils.AsyncExecute(self.output,d,args,partial(self.countCompiled,d)),jobs)
+            utils.appendColorLine(self.output,'Building {} (-j {})'.format(os.path.basename(d),jobs),'#000080')
+            free=free-jobs
+
+    def countCompiled(self,dir,lines):
+        self.compiled[dir]=self.compiled.get(dir)+len([line for line in lines if isCompileLine(line)])
+
+    def progress(self):
+        '''
+        Returns the progress of the running projects, as compiled/total objects
+        '''
+        res=[]
+        for d in sorted(self.running.keys()):
+            res.append('{} {}/{}'.format(os.path.basename(d),self.compiled.get(d),self.totals.get(d)))
+        return 'Building '+', '.join(res)
+
+    def poll(self):
+        if self.rc is not None:
+            return True
+        if self.cleaner:
+            if not self.cleaner.poll():
+                return False
+            self.text.extend(self.cleaner.text)
+            if self.cleaner.rc!=0:
+                self.failed=self.cleaner.rc
+                self.pending.clear()
+            self.cleaner=None
+        for d in self.running.keys():
+            (ae,jobs)=self.running.get(d)
+            if ae.poll():
+                self.text.extend(ae.text)
+                del self.running[d]
+                if ae.rc!=0:
+                    # Let the running projects finish, but start no more
+                    self.failed=ae.rc
+                    self.pending.clear()
+                else:
+                    self.done.add(d)
+        if not self.failed:
+            self.start()
+        if len(self.running)>0:
+            if self.status:
+                self.status(self.progress())
+            return False
+        if len(self.pending)>0:
+            utils.appendColorLine(self.output,'Circular library dependencies','#ff0000')
+            self.failed=1
+        self.rc=self.failed
+        return True
@@ -3,6 +3,7 @@ from PyQt4 import QtGui
 import uis
 import os
 import utils
+import buildjobs
 
 class FontSettingsDialog(QtGui.QDialog):
     """
@@ -69,24 +70,48 @@ class FontSettingsDialog(QtGui.QDialog):
         super(FontSettingsDialog,self).accept()
 
 class GeneralSettingsDialog(QtGui.QDialog):
-    def __init__(self,parent=None):
+    def __init__(self,ws,parent=None):
         super(GeneralSettingsDialog,self).__init__(parent)
         uis.loadDialog('general_settings',self)
+        self.ws=ws
         s=QtCore.QSettings()
         self.sortFilesCB.setCheckState(QtCore.Qt.Checked if s.value('sortFiles',True).toBool() else QtCore.Qt.Unchecked)
         self.customPrinters.setCheckState(QtCore.Qt.Checked if s.value('customPrinters',True).toBool() else QtCore.Qt.Unchecked)
         self.clearCacheButton.clicked.connect(self.clearCache)
+        self.outputLines.setValue((s.value('output_lines',100000).toInt())[0])
+        js=buildjobs.jobSettings(ws)
+        self.jobsPolicyCB.addItems(buildjobs.policies)
+        self.jobsPolicyCB.currentIndexChanged.connect(self.jobsPolicyChanged)
+        self.jobsPolicyCB.setCurrentIndex(buildjobs.policies.index(js.policy) if js.policy in buildjobs.policies else 0)
+        self.jobsCount.setValue(js.count)
+        self.jobsMemory.setValue(js.memory)
+        self.jobsLoad.setValue(js.load)
+        self.workspaceJobsCB.setCheckState(QtCore.Qt.Checked if buildjobs.isWorkspaceOverride(ws) else QtCore.Qt.Unchecked)
+        self.jobsPolicyChanged()
     
+    def jobsPolicyChanged(self):
+        policy=self.jobsPolicyCB.currentText()
+        self.jobsCount.setEnabled(policy=='Fixed')
+        self.jobsMemory.setEnabled(policy=='Memory')
+
     def save(self):
         s=QtCore.QSettings()
         s.setValue('sortFiles',(self.sortFilesCB.checkState() == QtCore.Qt.Checked))
         s.setValue('customPrinters',(self.customPrinters.checkState() == QtCore.Qt.Checked))
+        s.setValue('output_lines',self.outputLines.value())
         s.sync()
+        js=buildjobs.JobSettings(self.jobsPolicyCB.currentText(),self.jobsCount.value(),self.jobsMemory.value(),self.jobsLoad.value())
+        buildjobs.save(js,self.ws,self.workspaceJobsCB.checkState() == QtCore.Qt.Checked)
         
     def clearCache(self):
         s=QtCore.QSettings()
         s.remove('all_packages')
         s.sync()
+        from symboldb import storePath
+        try:
+            os.remove(storePath())
+        except OSError:
+            pass
         QtGui.QMessageBox.information(self,"Clear Cache","Restart IDE to reload...")
     
 
@@ -0,0 +1,121 @@
+import os
+import sqlite3
+from PyQt4 import QtCore
+
+schema=[
+    'CREATE TABLE IF NOT EXISTS libraries (id INTEGER PRIMARY KEY, path TEXT UNIQUE, size INTEGER, mtime REAL, inode INTEGER)',
+    'CREATE TABLE IF NOT EXISTS symbols (symbol TEXT, lib INTEGER)',
+    'CREATE INDEX IF NOT EXISTS symbols_symbol ON symbols (symbol)',
+    'CREATE INDEX IF NOT EXISTS symbols_lib ON symbols (lib)',
+    'CREATE TABLE IF NOT EXISTS refs (lib INTEGER, ref TEXT)',
+    'CREATE INDEX IF NOT EXISTS refs_lib ON refs (lib)'
+]
+
+def storePath():
+    '''
+    Returns the path of the library symbols database, next to the settings file
+    '''
+    return os.path.join(os.path.dirname(QtCore.QSettings().fileName()),'library_symbols.db')
+
+class SymbolStore:
+    '''
+    The symbols defined by each system library, and the names suggested
+    for each library (its packages), in an SQLite database.
+
+    Lookups are read-only dictionary operations from a symbol to the set
+    of suggested names, which query the database.  The connection is
+    opened when it is first used, so the store can be passed from the
+    scanner process by its path
+    '''
+    def __init__(self,path):
+        self.path=path
+        self.db=None
+        self.found={}
+
+    def __getstate__(self):
+        return {'path':self.path}
+
+    def __setstate__(self,state):
+        self.__init__(state.get('path'))
+
+    def connection(self):
+        if not self.db:
+            self.db=sqlite3.connect(self.path)
+            self.db.text_factory=str
+            for sql in schema:
+                self.db.execute(sql)
+        return self.db
+
+    def close(self):
+        if self.db:
+            self.db.commit()
+            self.db.close()
+            self.db=None
+
+    def libraries(self):
+        '''
+        Returns the stored libraries as {path: [size,mtime,inode]}
+        '''
+        res={}
+        for (path,size,mtime,inode) in self.connection().execute('SELECT path,size,mtime,inode FROM libraries'):
+            res[path]=[size,mtime,inode]
+        return res
+
+    def libraryId(self,path):
+        row=self.connection().execute('SELECT id FROM libraries WHERE path=?',(path,)).fetchone()
+        return row[0] if row else None
+
+    def removeLibrary(self,path):
+        db=self.connection()
+        id=self.libraryId(path)
+        if id is not None:
+            db.execute('DELETE FROM symbols WHERE lib=?',(id,))
+            db.execute('DELETE FROM refs WHERE lib=?',(id,))
+            db.execute('DELETE FROM libraries WHERE id=?',(id,))
+        self.found={}
+
+    def setLibrary(self,path,key,syms):
+        '''
+        Replace the symbols of a library
+        '''
+        self.removeLibrary(path)
+        db=self.connection()
+        cur=db.execute('INSERT INTO libraries (path,size,mtime,inode) VALUES (?,?,?,?)',[path]+key)
+        id=cur.lastrowid
+        db.executemany('INSERT INTO symbols (symbol,lib) VALUES (?,?)',[(sym,id) for sym in set(syms)])
+
+    def setReferences(self,refs):
+        '''
+        Set the names suggested for each library, from {path: names}
+        '''
+        db=self.connection()
+        db.execute('DELETE FROM refs')
+        rows=[]
+        for (id,path) in db.execute('SELECT id,path FROM libraries').fetchall():
+            rows.extend([(id,ref) for ref in refs.get(path,[])])
+        db.executemany('INSERT INTO refs (lib,ref) VALUES (?,?)',rows)
+        self.found={}
+
+    def commit(self):
+        self.connection().commit()
+
+    def get(self,sym,default=None):
+        if not sym in self.found:
+            rows=self.connection().execute('SELECT DISTINCT refs.ref FROM symbols JOIN refs ON symbols.lib=refs.lib WHERE symbols.symbol=?',(sym,))
+            self.found[sym]=set([row[0] for row in rows])
+        res=self.found.get(sym)
+        if len(res)==0:
+            return default
+        return res
+
+    def __contains__(self,sym):
+        return self.get(sym) is not None
+
+    def __getitem__(self,sym):
+        res=self.get(sym)
+        if res is None:
+            raise KeyError(sym)
+        return res
+
+    def __nonzero__(self):
+        return True
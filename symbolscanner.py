@@ -1,8 +1,11 @@
 from PyQt4 import QtCore
-import sys
 import os
 #import re
+import struct
 import utils
+import symboldb
+import elfsyms
+from multiprocessing import Pool, cpu_count
 from system import listAllPackages, libraryDirs
 #from globals import is_src_ext
 
@@ -14,38 +17,77 @@ def baseLibName(f):
         f=f[0:p]
     return f
 
-def isLibraryDir(dir):
+def stripArgs(sym):
+    par=sym.find('(')
+    if par>0:
+        sym=sym[0:par]
+    return sym
+
+def staticSymbols(path):
+    '''
+    Returns the text and bss symbols defined in a static library
+    '''
+    return [stripArgs(sym) for sym in elfsyms.demangle(elfsyms.archiveSymbols(path))]
+
+def dynamicSymbols(path):
+    '''
+    Returns the dynamic symbols of a shared library
+    '''
+    return [stripArgs(sym) for sym in elfsyms.demangle(elfsyms.sharedSymbols(path))]
+
+def librarySymbols(path):
+    '''
+    Returns the (path,symbols) of a library.  Runs in the scanner pool
+    '''
     try:
-        path=os.path.join(dir,'Makefile')
-        for line in open(path):
-            s=line.strip()
-            if s=='TYPE=LIB':
-                return True
-    except IOError:
-        pass
-    return False
+        if path.endswith('.a'):
+            return (path,staticSymbols(path))
+        return (path,dynamicSymbols(path))
+    except (IOError,OSError,ValueError,struct.error):
+        return (path,[])
+
+def listLibraries(dirs):
+    '''
+    Returns the paths of the static and shared libraries in dirs
+    '''
+    res=[]
+    for dir in dirs:
+        try:
+            files=os.listdir(dir)
+        except OSError:
+            continue
+        res.extend([os.path.join(dir,f) for f in files if f.endswith('.a') or f.endswith('.so')])
+    return res
+
+def libraryKey(path):
+    '''
+    Returns the [size,mtime,inode] of a library, which change when
+    the library is replaced
+    '''
+    st=os.stat(path)
+    return [st.st_size,st.st_mtime,st.st_ino]
 
 class Scanner:
     instance=None
 
-    def __init__(self,ws,libSyms=None,wsSyms=None,wsLibs=None):
+    def __init__(self,ws,libSyms=None,wsSyms=None,wsLibs=None,wsArchives=None,progress=None):
         self.ws=ws
         self.libraryMap={}
-        if libSyms and wsSyms and wsLibs:
+        self.progress=progress
+        if libSyms is not None:
             self.librarySymbols=libSyms
             self.workspaceSymbols=wsSyms
             self.workspaceLibSyms=wsLibs
+            self.archiveTimes=wsArchives or {}
         else:
             self.packages=listAllPackages()
-            if self.isPackageListChanged():
+            self.librarySymbols=symboldb.SymbolStore(symboldb.storePath())
+            changed=self.updateLibraries()
+            if self.isPackageListChanged() or changed:
                 self.libraryMap=self.mapLibrariesToPackages()
-                self.librarySymbols=self.querySymbols()
                 self.saveLists()
                 self.libraryMap={}
-            else:
-                utils.timestamp('load library lists')
-                self.loadLists()
-                utils.timestamp('Done load')
+            self.librarySymbols.close()
             self.workspaceLibSyms={}
             self.workspaceSymbols={}
             self.scanWorkspaceSymbols()
@@ -58,44 +100,48 @@ class Scanner:
         return True
         
     def saveLists(self):
+        '''
+        Store the names suggested for each library, which depend on the packages
+        '''
+        store=self.librarySymbols
+        refs={}
+        for path in store.libraries():
+            refs[path]=self.libraryRefs(os.path.basename(path))
+        store.setReferences(refs)
+        store.commit()
         s=QtCore.QSettings()
         s.setValue('all_packages',','.join(self.packages))
-        index={}
-        for i in xrange(0,len(self.packages)):
-            index[self.packages[i]]=i
-        all=[]
-        for sym in self.librarySymbols:
-            refsIdx=[]
-            refs=self.librarySymbols.get(sym)
-            for r in refs:
-                if r in index:
-                    refsIdx.append(str(index.get(r)))
-                else:
-                    refsIdx.append(r)
-            all.append(sym+"."+','.join(refsIdx))
-        s.setValue('library_symbols',';'.join(all))
+        # Symbols were stored in the settings, and then in a JSON
+        # cache file, before the symbol database
+        s.remove('library_symbols')
         s.sync()
-        
-    def loadLists(self):
-        s=QtCore.QSettings()
-        utils.timestamp('load from settings')
-        ls=s.value('library_symbols').toString()
-        utils.timestamp('deserialize')
-        self.librarySymbols={}
-        all=ls.split(';')
-        for s in all:
-            if s:
-                pos=s.find('.')
-                if pos>0:
-                    sym=s[0:pos]
-                    refs=s[pos+1:].split(',')
-                    rset=set()
-                    self.librarySymbols[sym]=rset
-                    for r in refs:
-                        try:
-                            rset.add(self.packages[int(r)])
-                        except ValueError:
-                            rset.add(r)
+        try:
+            os.remove(os.path.join(os.path.dirname(s.fileName()),'library_symbols.cache'))
+        except OSError:
+            pass
+
+    def updateLibraries(self):
+        '''
+        Dump the symbols of the libraries added or changed since they
+        were stored, and drop the removed libraries.
+        Returns True if the stored libraries changed
+        '''
+        store=self.librarySymbols
+        stored=store.libraries()
+        keys={}
+        for path in listLibraries(libraryDirs()):
+            try:
+                keys[path]=libraryKey(path)
+            except OSError:
+                pass
+        removed=[path for path in stored if not path in keys]
+        for path in removed:
+            store.removeLibrary(path)
+        changed=[path for path in keys if stored.get(path)!=keys.get(path)]
+        for (path,syms) in self.dumpLibraries(changed):
+            store.setLibrary(path,keys.get(path),syms)
+        store.commit()
+        return len(removed)+len(changed)>0
 
     def mapLibrariesToPackages(self):
         libmap={}
@@ -117,105 +163,89 @@ class Scanner:
             pass
         return libmap
     
-    def parseStatic(self,path,symbols,f):
-        (out,err)=utils.call('.','objdump','-t','-C',path)
-        refs=set()
-        if not f in self.libraryMap:
-            refs.add(baseLibName(f))
-        else:
-            refs=self.libraryMap.get(f)
-        dump=out.split('\n')
-        for line in dump:
-            parts=line.split('\t')
-            if len(parts)!=2:
-                continue
-            left=parts[0].split()
-            right=parts[1].split()
-            if (left[-1]=='.text' or left[-1]=='.bss') and not right[-1].startswith('.'):
-                sym=right[-1]
-                par=sym.find('(')
-                if par>0:
-                    sym=sym[0:par]
-                if not sym in symbols:
-                    s=set()
-                    s.update(refs)
-                    symbols[sym]=s
-                else:
-                    s=symbols.get(sym)
-                    s.update(refs)
-    
-    def parseDynamic(self,path,symbols,f):
-        (out,err)=utils.call('.','objdump','-T','-C',path)
-        refs=set()
+    def libraryRefs(self,f):
+        '''
+        Returns the names suggested for a library file: its packages,
+        or the library name if it is not in a package
+        '''
         if not f in self.libraryMap:
-            refs.add(baseLibName(f))
-        else:
-            refs=self.libraryMap.get(f)
-        dump=out.split('\n')
-        for line in dump:
-            parts=line.split()
-            if len(parts)>=7:
-                sym=parts[-1]
-                par=sym.find('(')
-                if par>0:
-                    sym=sym[0:par]
-                if not sym in symbols:
-                    s=set()
-                    s.update(refs)
-                    symbols[sym]=s
-                else:
-                    s=symbols.get(sym)
-                    s.update(refs)
-    
-    def querySymbols(self,printout=False):
-        symbols={}
-        dirs=libraryDirs()
-        for dir in dirs:
-            try:
-                files=os.listdir(dir)
-                files=[f for f in files if f.endswith('.a') or f.endswith('.so')]
-                for f in files:
-                    path=os.path.join(dir,f)
-                    if f.endswith('.a'):
-                        self.parseStatic(path,symbols,f)
-                    else:
-                        self.parseDynamic(path,symbols,f)
-            except OSError:
-                pass
-        if printout:
-            for sym in symbols:
-                print sym
-                s=symbols.get(sym)
-                for l in s:
-                    sys.stdout.write("  "+l)
-                sys.stdout.write('\n')
-        return symbols
-        
-#    def scanWorkspaceDirectory(self,dir,files=[]):
-#        libname=(dir.split('/'))[-1]
-#        self.removeLibRefs(libname)
-#        if len(files)==0:
-#            files=os.listdir(dir)
-#        files=[f for f in files if is_src_ext(f)]
-#        for f in files:
-#            path=os.path.join(dir,f)
-#            for line in open(path,'r').readlines():
-#                words=re.split('\W+',line.strip())
-#                for word in words:
-#                    if not word in self.workspaceSymbols:
-#                        self.workspaceSymbols[word]=set()
-#                    if not libname in self.workspaceLibSyms:
-#                        self.workspaceLibSyms[libname]=set()
-#                    self.workspaceSymbols.get(word).add(libname)
-#                    self.workspaceLibSyms.get(libname).add(word)
+            return set([baseLibName(f)])
+        return self.libraryMap.get(f)
 
-    def scanWorkspaceSymbols(self,printOut=False):
-        self.workspaceSymbols.clear()
+    def dumpLibraries(self,paths):
+        '''
+        Dump the symbols of libraries in a pool of processes.
+        Returns the (path,symbols) of each library
+        '''
+        res=[]
+        if len(paths)==0:
+            return res
+        pool=Pool(cpu_count())
+        try:
+            for r in pool.imap_unordered(librarySymbols,paths,8):
+                res.append(r)
+                if self.progress:
+                    self.progress(len(res),len(paths))
+        finally:
+            pool.close()
+            pool.join()
+        return res
+
+    def workspaceArchives(self):
+        '''
+        Returns the built workspace libraries, as {path: mtime}
+        '''
+        res={}
         for dir,subdirs,files in os.walk(os.path.join(self.ws,'out')):
             for f in files:
                 if f.startswith('lib') and f.endswith('.a'):
                     path=os.path.join(dir,f)
-                    self.parseStatic(path,self.workspaceSymbols,f)
+                    try:
+                        res[path]=os.path.getmtime(path)
+                    except OSError:
+                        pass
+        return res
+
+    def scanWorkspaceLibrary(self,libname,paths):
+        '''
+        Read the symbols of the archives of a workspace library,
+        which are built for each configuration, replacing its old symbols
+        '''
+        self.removeLibRefs(libname)
+        syms=set()
+        for path in paths:
+            try:
+                syms.update(staticSymbols(path))
+            except (IOError,OSError,ValueError,struct.error):
+                pass
+        if len(syms)>0:
+            self.workspaceLibSyms[libname]=syms
+            for sym in syms:
+                if not sym in self.workspaceSymbols:
+                    self.workspaceSymbols[sym]=set()
+                self.workspaceSymbols.get(sym).add(libname)
+
+    def rescanWorkspaceSymbols(self):
+        '''
+        Read again the workspace libraries with archives that were
+        built or removed since they were read.  Returns True if any changed
+        '''
+        archives=self.workspaceArchives()
+        changed=set()
+        for path in set(archives.keys()+self.archiveTimes.keys()):
+            if archives.get(path)!=self.archiveTimes.get(path):
+                changed.add(baseLibName(os.path.basename(path)))
+        for libname in changed:
+            paths=[path for path in archives if baseLibName(os.path.basename(path))==libname]
+            self.scanWorkspaceLibrary(libname,paths)
+        self.archiveTimes=archives
+        return len(changed)>0
+
+    def scanWorkspaceSymbols(self,printOut=False):
+        self.workspaceSymbols.clear()
+        self.workspaceLibSyms.clear()
+        self.archiveTimes={}
+        self.rescanWorkspaceSymbols()
         if printOut:
             f=open('ws_syms.txt','w')
             for s in self.workspaceSymbols:
@@ -235,26 +265,34 @@ class Scanner:
         if libname in self.workspaceLibSyms:
             words=self.workspaceLibSyms.get(libname)
             for word in words:
-                self.workspaceSymbols.get(word).remove(libname)
+                libs=self.workspaceSymbols.get(word)
+                if libs is not None:
+                    libs.discard(libname)
+                    if len(libs)==0:
+                        del self.workspaceSymbols[word]
             del self.workspaceLibSyms[libname]
         
 
 
-def getLibrarySymbols(ws):
+def getLibrarySymbols(ws,progress=None):
     if Scanner.instance is None:
-        Scanner.instance=Scanner(ws)
+        Scanner.instance=Scanner(ws,progress=progress)
     return (Scanner.instance.librarySymbols,
             Scanner.instance.workspaceSymbols,
-            Scanner.instance.workspaceLibSyms
+            Scanner.instance.workspaceLibSyms,
+            Scanner.instance.archiveTimes
            )
 
-def setInitialResults(ws,libSyms,wsSyms,wsLibs):
-    Scanner.instance=Scanner(ws,libSyms,wsSyms,wsLibs)
+def setInitialResults(ws,libSyms,wsSyms,wsLibs,wsArchives):
+    Scanner.instance=Scanner(ws,libSyms,wsSyms,wsLibs,wsArchives)
 
-def rescanOnFileSave(filepath):
-    dir=os.path.dirname(filepath)
-    if Scanner.instance and isLibraryDir(dir):
-        Scanner.instance.scanWorkspaceDirectory(dir)
+def rescanWorkspace():
+    '''
+    Read the workspace libraries that were built since they were last read
+    '''
+    if Scanner.instance:
+        return Scanner.instance.rescanWorkspaceSymbols()
+    return False
 
 def setWorkspacePath(ws):
     if Scanner.instance:
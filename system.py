@@ -1,6 +1,7 @@
 import utils
 import re
 from multiprocessing import Process, Queue
+from Queue import Empty
 import callbacks
 
 
@@ -21,8 +22,15 @@ def listAllPackages():
     return sorted(list(res))
 
 def symbolScan(q,ws):
+    '''
+    Scanner process.  Puts ('progress',done,total) messages while the
+    libraries are scanned, and ('done',results) at the end
+    '''
     import symbolscanner
-    q.put(symbolscanner.getLibrarySymbols(ws))
+    def progress(done,total):
+        if done%16==0 or done==total:
+            q.put(('progress',done,total))
+    q.put(('done',symbolscanner.getLibrarySymbols(ws,progress)))
 
 noMP=False
 scanq=Queue()
@@ -34,20 +42,49 @@ scanStarted=False
 libSyms=None
 wsSyms=None
 wsLibs=None
+wsArchives=None
+scanResult=None
+scanProgress=(0,0)
+
+def readScanQueue(block=False):
+    '''
+    Read the messages of the scanner process.
+    Returns True once the results are received
+    '''
+    global scanResult
+    global scanProgress
+    while scanResult is None:
+        try:
+            msg=scanq.get(block)
+        except Empty:
+            return False
+        if msg[0]=='progress':
+            scanProgress=msg[1:]
+        else:
+            scanResult=msg[1]
+    return True
 
 def isScannerDone():
     if scanq:
-        return not scanq.empty()
+        return readScanQueue()
     return True
 
+def scannerProgress():
+    '''
+    Returns the (done,total) libraries of the running scan
+    '''
+    return scanProgress
+
 def disableSymbolScan():
     global libSyms
     global wsSyms
     global wsLibs
+    global wsArchives
     global scanq
     libSyms={}
     wsSyms={}
     wsLibs={}
+    wsArchives={}
     scanq=None
 
 def startSymbolScan(ws):
@@ -65,13 +102,15 @@ def startSymbolScan(ws):
         global libSyms
         global wsSyms
         global wsLibs
+        global wsArchives
         import symbolscanner
-        (libSyms,wsSyms,wsLibs)=symbolscanner.getLibrarySymbols(workspacePath)
+        (libSyms,wsSyms,wsLibs,wsArchives)=symbolscanner.getLibrarySymbols(workspacePath)
     
 def getLibrarySymbols():
     global libSyms
     global wsSyms
     global wsLibs
+    global wsArchives
     global scannerProcess
     global scanq
     if not libSyms:
@@ -79,9 +118,11 @@ def getLibrarySymbols():
             libSyms={}
             wsSyms={}
             wsLibs={}
+            wsArchives={}
         else:
             utils.timestamp('Getting scan results from queue')
-            (libSyms,wsSyms,wsLibs)=scanq.get()
+            readScanQueue(True)
+            (libSyms,wsSyms,wsLibs,wsArchives)=scanResult
             utils.timestamp('Done queue get')
         if scannerProcess:
             utils.timestamp('Joining scan process')
@@ -92,7 +133,7 @@ def getLibrarySymbols():
             scanq.close()
         scanq=None
         import symbolscanner
-        symbolscanner.setInitialResults(workspacePath,libSyms,wsSyms,wsLibs)
+        symbolscanner.setInitialResults(workspacePath,libSyms,wsSyms,wsLibs,wsArchives)
     return libSyms
     
 def getWorkspaceSymbols():
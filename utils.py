@@ -1,7 +1,9 @@
 import os
 import time
 import subprocess
-import select
+import fcntl
+import errno
+from collections import deque
 from PyQt4 import QtGui
 
 iconsDir='.'
@@ -29,19 +31,13 @@ def message(msg):
 def errorMessage(msg):
     message(msg)
 
-# Find the dependency on a header in a makefile 
-# and return an object path that depends on it
-def objForHeader(mkPath,headerPath):
-    for line in open(mkPath,'r').readlines():
-        p=line.strip().split()
-        if len(p)==0:
-            continue
-        p0=p[0]
-        if p0.endswith('.o:') and '/Debug/' in p0:
-            o=p0[0:-1]
-            if headerPath in p:
-                return o
-    return ''
+def objsForHeader(root,headerPath):
+    '''
+    Returns all the workspace objects that include the header,
+    from the include graph index
+    '''
+    import genmake
+    return genmake.getContext(root).includeGraph().objectsFor(headerPath)
 
 def appendOutput(output,text):
     #text=output.toPlainText()
@@ -52,41 +48,90 @@ def appendOutput(output,text):
     #output.ensureCursorVisible()
     output.appendLine(text)
 
-def appendColorLine(output,line,color):
-    line=line.decode('utf8')
+def appendColorLines(output,lines,color):
     c=output.textCursor()
     c.movePosition(QtGui.QTextCursor.End)
     f=c.charFormat()
     f.setForeground(QtGui.QBrush(QtGui.QColor(color)))
     c.setCharFormat(f)
     output.setTextCursor(c)
-    output.appendLine(line)
+    output.appendLines([line.decode('utf8','replace') for line in lines])
+
+def appendColorLine(output,line,color):
+    appendColorLines(output,[line],color)
     
 
-def appendLine(output,line):
+# Commands that run the compiler, and are omitted when
+# summarizing compile and link lines
+launchers=['ccache','sccache']
+
+def stripLauncher(line):
+    '''
+    Remove the compiler launcher, and the environment
+    assignments before it, from a command line.
+    The build report timer is removed as well
+    '''
+    parts=line.split(' ')
+    for i in xrange(0,len(parts)-1):
+        if parts[i] in launchers:
+            return stripLauncher(' '.join(parts[i+1:]))
+        if parts[i+1].endswith('buildtimer.py'):
+            return stripLauncher(' '.join(parts[i+3:]))
+        if not '=' in parts[i]:
+            break
+    return line
+
+def formatLine(line):
+    '''
+    Returns the (line,color) of a build output line as it is shown,
+    or None if the line is not shown
+    '''
     if line.find('Nothing to be done for')>0:
-        return
-    if line!='':
-        parts=line.split(' ')
-        color='#000000'
-        if len(parts)>2 and parts[1]=='-c':
-            line='Compiling '+parts[-1]
-            color='#000080'
-        elif line.startswith('ar cr '):
-            libname=(parts[2].split('/'))[-1]
-            line='Creating library {}'.format(libname)
-            color='#000080'
-        elif line.startswith('g++ -o'):
-            appname=(parts[2].split('/'))[-1]
-            line='Linking {}'.format(appname)
-            color='#000080'
-        elif parts[0]=='cppcheck':
-            return
-        lower=line.lower()
-        if lower.find('error')>0:
-            appendColorLine(output,line,'#ff0000')
-        else:
-            appendColorLine(output,line,color)
+        return None
+    if line=='':
+        return None
+    line=stripLauncher(line)
+    parts=line.split(' ')
+    color='#000000'
+    if len(parts)>2 and parts[1]=='-c':
+        line='Compiling '+parts[-1]
+        color='#000080'
+    elif parts[0] in ['ar','gcc-ar'] and len(parts)>2 and parts[1]=='cr':
+        libname=(parts[2].split('/'))[-1]
+        line='Creating library {}'.format(libname)
+        color='#000080'
+    elif line.startswith('g++ -o'):
+        appname=(parts[2].split('/'))[-1]
+        line='Linking {}'.format(appname)
+        color='#000080'
+    elif parts[0]=='cppcheck':
+        return None
+    lower=line.lower()
+    if lower.find('error')>0:
+        color='#ff0000'
+    return (line,color)
+
+def appendLine(output,line):
+    appendLines(output,[line])
+
+def appendLines(output,lines):
+    '''
+    Append build output lines, with a single insert for each
+    run of lines of the same color
+    '''
+    group=[]
+    groupColor=None
+    for line in lines:
+        res=formatLine(line)
+        if res:
+            (line,color)=res
+            if color!=groupColor and len(group)>0:
+                appendColorLines(output,group,groupColor)
+                group=[]
+            group.append(line)
+            groupColor=color
+    if len(group)>0:
+        appendColorLines(output,group,groupColor)
 
 def checkFor(cmd):
     try:
@@ -112,39 +157,74 @@ def shellrun(dir,cmd):
 def shellcall(dir,cmd):
     return shellrun(dir,cmd).communicate()
 
+class LineReader:
+    '''
+    Non blocking reader of the lines of a pipe.  Each read drains the
+    bytes available, up to a limit, and keeps a partial last line
+    until the rest of it is read
+    '''
+    def __init__(self,f,limit=1<<20):
+        self.fd=f.fileno()
+        self.limit=limit
+        self.carry=''
+        self.closed=False
+        flags=fcntl.fcntl(self.fd,fcntl.F_GETFL)
+        fcntl.fcntl(self.fd,fcntl.F_SETFL,flags|os.O_NONBLOCK)
+
+    def read(self):
+        '''
+        Returns the complete lines read since the last call
+        '''
+        chunks=[self.carry]
+        total=0
+        while total<self.limit:
+            try:
+                data=os.read(self.fd,65536)
+            except OSError as e:
+                if e.errno in [errno.EAGAIN,errno.EWOULDBLOCK,errno.EINTR]:
+                    break
+                raise
+            if len(data)==0:
+                self.closed=True
+                break
+            chunks.append(data)
+            total=total+len(data)
+        lines=''.join(chunks).split('\n')
+        self.carry=lines.pop()
+        if self.closed and len(self.carry)>0:
+            lines.append(self.carry)
+            self.carry=''
+        return lines
+
 class AsyncExecute:
-    def __init__(self,output,dir,cmdlist):
+    '''
+    Run a command, and show its output lines as they are written.
+    The last maxLines output lines are kept in text.
+    If set, onLines is called with each batch of new lines
+    '''
+    def __init__(self,output,dir,cmdlist,onLines=None,maxLines=20000):
         self.output=output
-        self.pdone=False
-        self.text=[]
-        self.act=1
+        self.text=deque(maxlen=maxLines)
         self.cmdlist=cmdlist
+        self.onLines=onLines
         self.rc=None
         self.process=subprocess.Popen(cmdlist, shell=False, stdout=subprocess.PIPE,stderr=subprocess.PIPE,cwd=dir)
+        self.readers=[LineReader(self.process.stdout),LineReader(self.process.stderr)]
         
     def poll(self):
-        if self.pdone and self.act==0:
+        if self.rc is not None:
             return True
-        reads=[self.process.stdout.fileno(),self.process.stderr.fileno()]
-        self.act=0
-        rc=select.select(reads,[],[],0)
-        for fd in rc[0]:
-            if fd==self.process.stdout.fileno():
-                line=self.process.stdout.readline().strip()
-                appendLine(self.output,line)
-                self.text.append(line)
-                if len(line)>0:
-                    self.act=self.act+1
-            if fd==self.process.stderr.fileno():
-                line=self.process.stderr.readline().strip()
-                appendLine(self.output,line)
-                self.text.append(line)
-                if len(line)>0:
-                    self.act=self.act+1
-        if self.process.poll()!=None:
-            self.rc=self.process.returncode
-            self.pdone=True
-        if self.pdone and self.act==0:
+        lines=[]
+        for r in self.readers:
+            if not r.closed:
+                lines.extend([line.strip() for line in r.read()])
+        if len(lines)>0:
+            appendLines(self.output,lines)
+            self.text.extend(lines)
+            if self.onLines:
+                self.onLines(lines)
+        if len([r for r in self.readers if not r.closed])==0:
+            self.rc=self.process.wait()
             return True
         return False
 
@@ -158,7 +238,12 @@ def pendingAsync():
 
 def execute(output,dir,cmd,*args):
     cmdlist=[cmd]+list(args)
-    ae=AsyncExecute(output,dir,cmdlist)
+    return addAsync(AsyncExecute(output,dir,cmdlist))
+
+def addAsync(ae):
+    '''
+    Add an object that is polled like an AsyncExecute process
+    '''
     async_executes.append(ae)
     return ae
     
@@ -174,36 +259,6 @@ def pollAsync():
     return res
         
 
-def old_execute(output,dir,cmd,*args):
-    output.clear()
-    cmdlist=[cmd]+list(args)
-    text=[]
-    pdone=False
-    act=1
-    p = subprocess.Popen(cmdlist, shell=False, stdout=subprocess.PIPE,stderr=subprocess.PIPE,cwd=dir)
-    while not pdone or act>0:
-        reads=[p.stdout.fileno(),p.stderr.fileno()]
-        act=0
-        rc=select.select(reads,[],[])
-        for fd in rc[0]:
-            if fd==p.stdout.fileno():
-                line=p.stdout.readline().strip()
-                appendLine(output,line)
-                text.append(line)
-                if len(line)>0:
-                    act=act+1
-            if fd==p.stderr.fileno():
-                line=p.stderr.readline().strip()
-                appendLine(output,line)
-                text.append(line)
-                if len(line)>0:
-                    act=act+1
-        if p.poll()!=None:
-            pdone=True
-        else:
-            time.sleep(0.05)
-    return text
-
 def findLine(path,prefix,removePrefix=False):
     f=open(path,"r")
     for line in f:
@@ -261,6 +261,9 @@ class WorkSpace(QtGui.QTreeWidget):
         newpath=os.path.dirname(oldpath)
         newpath=os.path.join(newpath,name)
         os.rename(oldpath,newpath)
+        for path in [oldpath,newpath]:
+            if is_src_ext(path):
+                self.mainWindow.patchQueue.add(path)
         self.refreshWorkspace()
         
     def deletePath(self):
@@ -269,6 +272,8 @@ class WorkSpace(QtGui.QTreeWidget):
         if res==QtGui.QMessageBox.Yes:
             try:
                 os.remove(path)
+                if is_src_ext(path):
+                    self.mainWindow.patchQueue.add(path)
                 self.refreshWorkspace()
             except OSError:
                 pass
@@ -326,9 +331,12 @@ class WorkSpace(QtGui.QTreeWidget):
             item=self.currentItem()
             path=item.data(0,DirectoryRole).toString()
             try:
-                f=open(os.path.join(path,name),"w")
+                path=os.path.join(path,name)
+                f=open(path,"w")
                 f.write("\n")
                 f.close()
+                if is_src_ext(path):
+                    self.mainWindow.patchQueue.add(path)
                 self.update()
             except IOError:
                 utils.message("Failed to create file")